@@ -7,6 +7,7 @@ from app.config.auth_config import supabase_client as supabase
 from app.modules.services.stripe.stripe_services import fetch_available_products_from_stripe, sync_report_types_with_stripe
 from app.modules.services.access.product_services import fetch_purchased_tokens_with_metadata
 from app.modules.services.auth.auth_utils import AuthenticationUtils
+from app.utils.cache import invalidate_user_profile
 
 
 router = APIRouter()
@@ -53,6 +54,7 @@ async def update_user(payload: UserUpdatePayload, user=Depends(AuthenticationUti
 
         user_id = user.get("id")
         update_response = supabase.table("users").update(update_fields).eq("id", user_id).execute()
+        invalidate_user_profile(user_id=user_id, sub=user.get("sub"))
 
         if update_response.error:
             logger.error(f"Supabase update error: {update_response.error}")
@@ -1,13 +1,17 @@
-import logging
+import asyncio, json, logging
 import pytz
 from fastapi import APIRouter, Request, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from datetime import datetime
 from uuid import UUID
 
 from app.utils.common_utils import validate_data_presence
 from app.config.auth_config import supabase_client as supabase
-from app.modules.tasks.report_generation import generate_report_chapter, generate_report_chapter_mock
+from app.modules.tasks.report_generation import generate_report
+from app.modules.services.reports.report_prompts import build_answers_context
+from app.modules.services.reports.report_events import report_event_hub
+from app.config import config
 from app.modules.services.auth.auth_utils import AuthenticationUtils
 
 logger = logging.getLogger(__name__)
@@ -105,19 +109,28 @@ async def trigger_report_generation(request: GenerationRequest, user=Depends(Aut
     # 2. Update token status
     supabase.table("report_access_tokens").update({"status": "generating"}).eq("id", token["id"]).execute()
 
-    # 3. Create report
-    report_res = supabase.table("reports").insert({
-        "report_type_id": report_type_id,
-        "input_session_id": session_id,
-        "status": "generating",
-        "version": 1,
-        "generated_at": datetime.now(pytz.timezone('utc')).isoformat()
-    }).execute()
+    # 3. Fetch chapters with their latest prompt (one embedded query)
+    chapters_res = supabase.table("chapters") \
+        .select("id, order_index, title, chapter_prompts(id, prompt_text, version)") \
+        .eq("report_type_id", report_type_id) \
+        .order("order_index") \
+        .order("version", desc=True, foreign_table="chapter_prompts") \
+        .limit(1, foreign_table="chapter_prompts") \
+        .execute()
 
-    report_id = report_res.data[0]["id"]
-    
-    # Update token with report ID
-    answers_res = supabase.table("report_access_tokens").update({"report_id":report_id}).eq("id", token['id']).execute()
+    chapters = []
+    for chapter in chapters_res.data:
+        if not chapter["chapter_prompts"]:
+            logger.error(f"Chapter {chapter['id']} has no prompt, leaving it out of the report")
+            continue
+        prompt = chapter["chapter_prompts"][0]
+        chapters.append({
+            "chapter_id": chapter["id"],
+            "chapter_prompt_id": prompt["id"],
+            "order_index": chapter["order_index"],
+            "title": chapter["title"],
+            "prompt": prompt["prompt_text"]
+        })
 
     # 4. Fetch answers
     answers_res = supabase.table("user_answers").select("question_id, answer_text, questions(question_text)").eq("input_session_id", session_id).execute()
@@ -132,70 +145,173 @@ async def trigger_report_generation(request: GenerationRequest, user=Depends(Aut
                 "answer": answer_text
             })
 
+    # 5. Create report, with the answers block every chapter prompt starts with and the chapter
+    # count the progress RPC completes it against
+    report_res = supabase.table("reports").insert({
+        "report_type_id": report_type_id,
+        "input_session_id": session_id,
+        "answers_context": build_answers_context(user_answers),
+        "total_chapters": len(chapters),
+        "status": "generating",
+        "version": 1,
+        "generated_at": datetime.now(pytz.timezone('utc')).isoformat()
+    }).execute()
 
-    # 5. Fetch chapters and prompts
-    chapters_res = supabase.table("chapters").select("id, order_index").eq("report_type_id", report_type_id).order("order_index").execute()
+    report_id = report_res.data[0]["id"]
     
-    for chapter in chapters_res.data:
-        prompt_res = supabase.table("chapter_prompts").select("id, prompt_text").eq("chapter_id", chapter["id"]).order("version", desc=True).limit(1).execute()
-        prompt = prompt_res.data[0]
-
-        # 6. Dispatch task
-        '''generate_report_chapter.apply_async(
-            args=[{
-                "session_id": session_id,
-                "report_id": report_id,
-                "report_type_id": report_type_id,
-                "chapter_id": chapter["id"],
-                "chapter_prompt_id": prompt["id"],
-                "order_index": chapter["order_index"],
-                "prompt": prompt["prompt_text"],
-                "user_answers": user_answers
-            }],
-            queue="reports"
-        )'''
-
-        generate_report_chapter_mock.apply_async(
-            args=[{
-                "session_id": session_id,
-                "report_id": report_id,
-                "report_type_id": report_type_id,
-                "chapter_id": chapter["id"],
-                "chapter_prompt_id": prompt["id"],
-                "order_index": chapter["order_index"],
-                "prompt": prompt["prompt_text"],
-                "user_answers": user_answers
-            }],
-            queue="reports"
-        )
+    # Update token with report ID
+    answers_res = supabase.table("report_access_tokens").update({"report_id":report_id}).eq("id", token['id']).execute()
+
+    # 6. Dispatch one task for the whole report; it runs the chapters concurrently in dependency order
+    # (config.reports.mock keeps the lorem ipsum chapters without OpenAI calls)
+    generate_report.apply_async(
+        args=[{
+            "session_id": session_id,
+            "report_id": report_id,
+            "report_type_id": report_type_id,
+            "chapters": chapters
+        }],
+        queue="reports"
+    )
 
     return {"status": "started", "report_id": report_id}
 
-@report_router.get("/progress/{token_id}")
-async def get_report_progress(token_id: str, user=Depends(AuthenticationUtils.get_authenticated_user)):
+def fetch_token_progress(token_id: str, user_id: str) -> dict:
     token_res = supabase.table("report_access_tokens") \
-        .select("report_id, report_type_id") \
+        .select("report_id, reports(progress, status, total_chapters)") \
         .eq("access_token", token_id) \
-        .eq("user_id", user["id"]) \
+        .eq("user_id", user_id) \
         .single().execute()
 
     if not token_res.data:
         raise HTTPException(status_code=404, detail="Token not found")
 
-    report_id = token_res.data["report_id"]
-    report_type_id = token_res.data["report_type_id"]
-
-    report_res = supabase.table("reports") \
-        .select("progress, status") \
-        .eq("id", report_id) \
-        .single().execute()
-
-    total_chapters_res = supabase.table("chapters").select("id").eq("report_type_id", report_type_id).execute()
-    total_chapters = len(total_chapters_res.data)
+    report = token_res.data["reports"] or {}
 
     return {
-        "progress": report_res.data["progress"],
-        "total": total_chapters,
-        "status": report_res.data["status"],
-        "report_id": report_id
+        "progress": report.get("progress"),
+        "total": report.get("total_chapters"),
+        "status": report.get("status"),
+        "report_id": token_res.data["report_id"]
     }
+
+
+@report_router.get("/progress/{token_id}")
+async def get_report_progress(token_id: str, user=Depends(AuthenticationUtils.get_authenticated_user)):
+    return fetch_token_progress(token_id, user["id"])
+
+
+# statuses after which a report's streams end
+FINISHED_STATUSES = {"completed", "failed"}
+
+
+def sse_message(data: dict) -> str:
+    return f"data: {json.dumps(data)}\n\n"
+
+
+async def relay_report_events(request: Request, queue, event_types: set[str]):
+    """SSE lines for the hub events of the given types, until the report completes or fails or the client leaves."""
+    while not await request.is_disconnected():
+        try:
+            event = await asyncio.wait_for(queue.get(), timeout=config.reports.sse_keepalive)
+        except asyncio.TimeoutError:
+            yield ": keepalive\n\n"
+            continue
+        if event.get("type", "progress") in event_types:
+            yield sse_message(event)
+        if event.get("type", "progress") == "progress" and event.get("status") in FINISHED_STATUSES:
+            return
+
+
+def stream_error(e: HTTPException) -> dict:
+    # terminal event for an SSE stream that can't go on; clients stop on "error" like on a finished status
+    return {"type": "error", "status": "error", "code": e.status_code, "message": e.detail}
+
+
+def sse_response(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@report_router.get("/progress/{token_id}/stream")
+async def stream_report_progress(token_id: str, request: Request, user=Depends(AuthenticationUtils.get_authenticated_user)):
+    """
+    Server-Sent Events: the current progress once, then one event per finished chapter until the
+    report completes or fails. Events come from the worker through report_event_hub; nothing is polled.
+    """
+    snapshot = await asyncio.to_thread(fetch_token_progress, token_id, user["id"])
+    report_id = snapshot["report_id"]
+
+    async def events():
+        if not report_id or snapshot["status"] in FINISHED_STATUSES:
+            yield sse_message(snapshot)
+            return
+        async with report_event_hub.watch(report_id) as queue:
+            # re-read after subscribing so a chapter finishing in between isn't missed
+            try:
+                latest = await asyncio.to_thread(fetch_token_progress, token_id, user["id"])
+            except HTTPException as e:
+                # the response has started, so the status code can't change any more; end the stream instead
+                yield sse_message(stream_error(e))
+                return
+            yield sse_message(latest)
+            if latest["status"] in FINISHED_STATUSES:
+                return
+            async for message in relay_report_events(request, queue, {"progress"}):
+                yield message
+
+    return sse_response(events())
+
+
+def fetch_report_chapters(report_id: str, user_id: str) -> tuple[dict, list[dict]]:
+    report_res = supabase.table("reports") \
+        .select("status, report_input_sessions!inner(user_id)") \
+        .eq("id", report_id) \
+        .eq("report_input_sessions.user_id", user_id) \
+        .limit(1).execute()
+    if not report_res.data:
+        raise HTTPException(status_code=404, detail="Report not found")
+    chapters_res = supabase.table("report_chapters") \
+        .select("chapter_id, content, order_index, is_partial, chapters(title)") \
+        .eq("report_id", report_id) \
+        .order("order_index") \
+        .execute()
+    return report_res.data[0], chapters_res.data
+
+
+@report_router.get("/{report_id}/stream")
+async def stream_report_chapters(report_id: str, request: Request, user=Depends(AuthenticationUtils.get_authenticated_user)):
+    """
+    Server-Sent Events for the report page while it is being written: every chapter as stored so far
+    (finished or checkpointed), then {"type": "chapter"} events carrying each chapter's text as it
+    streams from the model ("done" once final) and {"type": "progress"} events, until the report completes or fails.
+    """
+    await asyncio.to_thread(fetch_report_chapters, report_id, user["id"])
+
+    async def events():
+        async with report_event_hub.watch(report_id) as queue:
+            # read after subscribing: anything written later arrives as an event
+            try:
+                report, chapters = await asyncio.to_thread(fetch_report_chapters, report_id, user["id"])
+            except HTTPException as e:
+                yield sse_message(stream_error(e))
+                return
+            for chapter in chapters:
+                yield sse_message({
+                    "type": "chapter",
+                    "chapter_id": chapter["chapter_id"],
+                    "order_index": chapter["order_index"],
+                    "title": (chapter.get("chapters") or {}).get("title"),
+                    "content": chapter["content"],
+                    "done": not chapter.get("is_partial"),
+                })
+            yield sse_message({"type": "progress", "status": report["status"], "report_id": report_id})
+            if report["status"] in FINISHED_STATUSES:
+                return
+            async for message in relay_report_events(request, queue, {"chapter", "progress"}):
+                yield message
+
+    return sse_response(events())
@@ -6,7 +6,8 @@ from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 from app.config.auth_config import supabase_client as supabase
 from app.utils.common_utils import validate_data_presence
-from app.modules.services.journal.journal_services import get_journal_entry_by_id
+from app.modules.services.journal.journal_services import get_journal_entry_by_id, find_today_entry_id
+from app.modules.services.journal.autosave_buffer import autosave_buffer
 from app.dependencies.auth import get_current_user_optional, get_current_user_required
 
 router = APIRouter()
@@ -35,6 +36,7 @@ def inject_common_context(request, user=None, dev_mode=False):
     today_str = None
     
     if user:
+        user_local_time = None
         try:
             tz_offset_min = user.get("user_settings", {}).get("tz_offset", 0)
             # server time in UTC
@@ -51,16 +53,9 @@ def inject_common_context(request, user=None, dev_mode=False):
             # fallback to UTC today if anything goes wrong
             today_str = datetime.now(timezone.utc).date().isoformat()
         
-        res = supabase.table("journal_entries") \
-            .select("id") \
-            .eq("user_id", user["id"]) \
-            .eq("entry_date", today_str) \
-            .limit(1) \
-            .execute()
-
-        has_today_entry = bool(res.data)
-        if has_today_entry:
-            today_entry_id = res.data[0]["id"]
+        # cached until the user's local midnight; shared with the WhatsApp logging path
+        today_entry_id = find_today_entry_id(user["id"], today_str, user_local_time)
+        has_today_entry = bool(today_entry_id)
 
     return {
         "request": request,
@@ -279,7 +274,7 @@ async def report_page(request: Request, report_id: str, user: dict = Depends(get
         raise HTTPException(404, detail="Report not found")
 
     # Fetch chapters
-    chapters = supabase.table("report_chapters").select("content, order_index, chapters(title)").eq("report_id", report_id).order("order_index").execute()
+    chapters = supabase.table("report_chapters").select("chapter_id, content, order_index, is_partial, chapters(title)").eq("report_id", report_id).order("order_index").execute()
 
     context = inject_common_context(request, user, dev_mode=True)
     context.update({
@@ -334,7 +329,7 @@ async def open_journal_entry(
     user=Depends(get_current_user_optional),
 ):
     try:
-        entry = await get_journal_entry_by_id(entry_id, user["id"])
+        entry = autosave_buffer.overlay(await get_journal_entry_by_id(entry_id, user["id"]), user["id"])
 
         logger.info(f'entry we got: {entry}')
         if not entry:
@@ -1,10 +1,13 @@
-import logging
+import hmac, logging
+from app.config import config
 from app.config.general_config import WaVariables
 
-from fastapi import APIRouter, Request, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import PlainTextResponse
-from app.modules.services.whatsapp.whatsapp_utils import handle_status_update
-from app.modules.services.whatsapp.whatsapp_services import handle_new_message
+from app.modules.services.whatsapp.whatsapp_queue import inbound_queue
+from app.modules.services.whatsapp.status_buffer import status_buffer
+from app.utils.dedupe import wamid_index
+from app.utils.transcription_cache import transcription_cache
 
 logger = logging.getLogger(__name__)
 
@@ -22,22 +25,14 @@ async def verify_webhook(request: Request):
     return PlainTextResponse(content="Verification failed", status_code=403)
 
 @router.post("/whatsapp")
-async def handle_message(request: Request, background_tasks: BackgroundTasks):
+async def handle_message(request: Request):
     data = await request.json()
     # logging.info(f"Data received (raw): {data}")
 
     try:
-        entry = data['entry'][0]
-        changes = entry['changes'][0]
-        value = changes['value']
-
-        if 'messages' in value:
-            background_tasks.add_task(handle_new_message, message_data=value['messages'][0])
-
-        elif 'statuses' in value:
-            logger.info(f"status message contains: (raw) {data}")
-            background_tasks.add_task(handle_status_update, value['statuses'][0])
-        else:
+        # Every entry/change/message/status is persisted; the worker pool does the rest.
+        queued = inbound_queue.enqueue_webhook(data)
+        if not queued:
             logger.warning("No 'messages' or 'statuses' key in the data")
 
     except Exception as e:
@@ -46,3 +41,21 @@ async def handle_message(request: Request, background_tasks: BackgroundTasks):
 
     return {"message": "Data processing in background"}
 
+
+def require_metrics_token(request: Request):
+    """Internal only: the endpoint doesn't exist unless METRICS_TOKEN is set, and then needs it as X-Metrics-Token."""
+    token = config.app.metrics_token
+    if not token:
+        raise HTTPException(status_code=404)
+    if not hmac.compare_digest(request.headers.get("X-Metrics-Token", ""), token):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@router.get("/metrics", dependencies=[Depends(require_metrics_token)])
+async def whatsapp_metrics():
+    return {
+        "inbound_queue": inbound_queue.stats(),
+        "status_buffer": status_buffer.stats(),
+        "wamid_index": wamid_index.stats(),
+        "transcription_cache": transcription_cache.stats(),
+    }
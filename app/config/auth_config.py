@@ -1,4 +1,5 @@
 # auth_config.py
+import threading
 from contextvars import ContextVar
 from supabase import create_client, Client
 from app.config import config
@@ -22,13 +23,53 @@ def _create_client(access_token: str | None = None, service_role: bool = False)
         client.postgrest.auth(access_token)
     return client
 
+def _apply_access_token(request):
+    """httpx request hook: overlay the per-request JWT on the pooled PostgREST session."""
+    access_token = _access_token.get()
+    if access_token:
+        request.headers["Authorization"] = f"Bearer {access_token}"
+
+
+class SupabaseClientRegistry:
+    """
+    Keeps one long-lived service-role client and one anon client so their
+    HTTP sessions (and keep-alive connections) are reused across requests.
+    The per-request JWT is applied as a header on each outgoing PostgREST
+    request instead of building a new client.
+    """
+    def __init__(self):
+        self._clients: dict[bool, Client] = {}
+        self._lock = threading.Lock()
+
+    def get(self, service_role: bool = False) -> Client:
+        client = self._clients.get(service_role)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(service_role)
+                if client is None:
+                    client = _create_client(service_role=service_role)
+                    client.postgrest.session.event_hooks["request"].append(_apply_access_token)
+                    self._clients[service_role] = client
+        return client
+
+    def reset(self):
+        with self._lock:
+            self._clients.clear()
+
+
+client_registry = SupabaseClientRegistry()
+
 def get_supabase_client() -> Client:
-    """Return a Supabase client configured for the current context."""
-    return _create_client(_access_token.get(), _use_service_role.get())
+    """Return the pooled Supabase client for the current context."""
+    return client_registry.get(_use_service_role.get())
 
 class SupabaseProxy:
-    """Proxy object that lazily creates a Supabase client per request."""
+    """Proxy object that resolves the pooled Supabase client for the current request context."""
     def __getattr__(self, name):
+        if name == "auth":
+            # GoTrue keeps the signed-in session on the client object, so auth
+            # calls get their own short-lived client and never touch the pool.
+            return _create_client(_access_token.get(), _use_service_role.get()).auth
         return getattr(get_supabase_client(), name)
 
 # Exported proxy used throughout the application
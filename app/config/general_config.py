@@ -22,6 +22,7 @@ class SupabaseSettings:
     service_role_key: str = os.getenv("SUPABASE_API_KEY", "")
     anon_key: str = os.getenv("SUPABASE_ANON_KEY", "")
     jwt_secret: str = os.getenv("JWT_SECRET", "")
+    db_pool_size: int = int(os.getenv("SUPABASE_DB_POOL_SIZE", 16))
 
 @dataclass
 class OpenAISettings:
@@ -53,6 +54,9 @@ class AppSettings:
     api_prefix: str = "/api"
     version: str = "0.1.0"
     project_name: str = "PurposeQuest AI"
+    user_cache_ttl: int = int(os.getenv("USER_CACHE_TTL", 300))
+    user_cache_size: int = int(os.getenv("USER_CACHE_SIZE", 1024))
+    metrics_token: str = os.getenv("METRICS_TOKEN", "")  # X-Metrics-Token for the internal metrics endpoints; unset disables them
 
 @dataclass
 class SubscriptionVariables:
@@ -91,6 +95,85 @@ class WaVariables:
     wa_ul_url: str = os.getenv("WA_UP_URL")
     wa_dl_url: str = os.getenv("WA_DL_URL")
 
+@dataclass
+class HttpClientSettings:
+    max_connections: int = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+    max_keepalive_connections: int = int(os.getenv("HTTP_MAX_KEEPALIVE", 20))
+    keepalive_expiry: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 60.0))
+    connect_timeout: float = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5.0))
+    read_timeout: float = float(os.getenv("HTTP_READ_TIMEOUT", 30.0))
+    http2: bool = os.getenv("HTTP_HTTP2", "true").lower() == "true"
+    stream_chunk_size: int = int(os.getenv("HTTP_STREAM_CHUNK_SIZE", 64 * 1024))
+    spool_max_size: int = int(os.getenv("HTTP_SPOOL_MAX_SIZE", 1024 * 1024))  # larger uploads spill to disk
+
+@dataclass
+class WaQueueSettings:
+    db_path: str = os.getenv("WA_QUEUE_DB_PATH", "./tmp/wa_inbound_queue.sqlite3")
+    workers: int = int(os.getenv("WA_QUEUE_WORKERS", 4))
+    shard_queue_size: int = int(os.getenv("WA_QUEUE_SHARD_SIZE", 16))
+    claim_batch: int = int(os.getenv("WA_QUEUE_CLAIM_BATCH", 32))
+    max_attempts: int = int(os.getenv("WA_QUEUE_MAX_ATTEMPTS", 3))
+    poll_interval: float = float(os.getenv("WA_QUEUE_POLL_INTERVAL", 1.0))
+
+@dataclass
+class WaStatusBufferSettings:
+    flush_interval: float = float(os.getenv("WA_STATUS_FLUSH_INTERVAL", 2.0))
+    max_batch: int = int(os.getenv("WA_STATUS_MAX_BATCH", 500))
+
+@dataclass
+class WamidIndexSettings:
+    enabled: bool = os.getenv("WAMID_INDEX_ENABLED", "true").lower() == "true"
+    capacity_per_bucket: int = int(os.getenv("WAMID_INDEX_CAPACITY", 50000))
+    fp_rate: float = float(os.getenv("WAMID_INDEX_FP_RATE", 0.001))
+    bucket_seconds: int = int(os.getenv("WAMID_INDEX_BUCKET_SECONDS", 3600))
+    buckets: int = int(os.getenv("WAMID_INDEX_BUCKETS", 12))  # covers the 10h old-message cutoff
+
+@dataclass
+class AudioSettings:
+    ffmpeg_bin: str = os.getenv("FFMPEG_BIN", "ffmpeg")
+    ffprobe_bin: str = os.getenv("FFPROBE_BIN", "ffprobe")
+    max_ffmpeg_procs: int = int(os.getenv("AUDIO_MAX_FFMPEG_PROCS", 2))
+    stt_max_concurrency: int = int(os.getenv("STT_MAX_CONCURRENCY", 4))  # Whisper requests in flight per process
+    stt_chunk_threshold: float = float(os.getenv("STT_CHUNK_THRESHOLD", 150))  # seconds; longer notes are split
+    stt_chunk_seconds: float = float(os.getenv("STT_CHUNK_SECONDS", 120))
+    stt_chunk_overlap: float = float(os.getenv("STT_CHUNK_OVERLAP", 2))
+    stt_max_file_mb: int = int(os.getenv("STT_MAX_FILE_MB", 24))  # API hard limit is 25 MB
+
+@dataclass
+class ScratchSettings:
+    base_dir: str = os.getenv("SCRATCH_DIR", "./tmp/scratch")
+    prefer_shm: bool = os.getenv("SCRATCH_PREFER_SHM", "true").lower() == "true"
+    quota_mb: int = int(os.getenv("SCRATCH_QUOTA_MB", 512))
+    audio_reserve_mb: int = int(os.getenv("SCRATCH_AUDIO_RESERVE_MB", 16))  # WhatsApp audio is capped at 16 MB
+    max_age: float = float(os.getenv("SCRATCH_MAX_AGE", 3600))
+    sweep_interval: float = float(os.getenv("SCRATCH_SWEEP_INTERVAL", 600))
+
+@dataclass
+class TranscriptionCacheSettings:
+    enabled: bool = os.getenv("TRANSCRIPTION_CACHE_ENABLED", "true").lower() == "true"
+    db_path: str = os.getenv("TRANSCRIPTION_CACHE_DB_PATH", "./tmp/transcription_cache.sqlite3")
+    max_mb: int = int(os.getenv("TRANSCRIPTION_CACHE_MAX_MB", 64))
+
+@dataclass
+class JournalAutosaveSettings:
+    debounce: float = float(os.getenv("JOURNAL_AUTOSAVE_DEBOUNCE", 5.0))  # seconds without a save before writing
+    max_delay: float = float(os.getenv("JOURNAL_AUTOSAVE_MAX_DELAY", 30.0))  # longest a save waits while typing continues
+    tick: float = float(os.getenv("JOURNAL_AUTOSAVE_TICK", 1.0))
+    conflict_ttl: float = float(os.getenv("JOURNAL_AUTOSAVE_CONFLICT_TTL", 24 * 3600))  # how long unwritten text waits for its client
+    max_conflicts: int = int(os.getenv("JOURNAL_AUTOSAVE_MAX_CONFLICTS", 1024))
+
+@dataclass
+class ReportSettings:
+    mock: bool = os.getenv("REPORTS_MOCK", "true").lower() == "true"  # lorem ipsum chapters, no OpenAI calls
+    mock_delay: float = float(os.getenv("REPORTS_MOCK_DELAY", 10.0))
+    max_concurrency: int = int(os.getenv("REPORT_MAX_CONCURRENCY", 6))  # chapter completions in flight per report
+    events_redis_url: str = os.getenv("REPORT_EVENTS_REDIS_URL", os.getenv("CELERY_BROKER_URL", "redis://127.0.0.1:6379/0"))
+    events_channel_prefix: str = os.getenv("REPORT_EVENTS_CHANNEL_PREFIX", "report_progress:")
+    sse_keepalive: float = float(os.getenv("REPORT_SSE_KEEPALIVE", 15.0))
+    watcher_queue_size: int = int(os.getenv("REPORT_WATCHER_QUEUE_SIZE", 256))  # events buffered per SSE stream
+    stream_publish_interval: float = float(os.getenv("REPORT_STREAM_PUBLISH_INTERVAL", 0.25))  # partial chapter text to the page
+    checkpoint_interval: float = float(os.getenv("REPORT_CHECKPOINT_INTERVAL", 3.0))  # partial chapter text to report_chapters
+
 @dataclass
 class MediaDirSettings:
         base_dir = "./tmp/downloads"
@@ -108,6 +191,15 @@ class Config:
     app: AppSettings = field(default_factory=AppSettings)
     subscription: SubscriptionVariables = field(default_factory=SubscriptionVariables)
     whatsappvars: WaVariables = field(default_factory=WaVariables)
+    http: HttpClientSettings = field(default_factory=HttpClientSettings)
+    waqueue: WaQueueSettings = field(default_factory=WaQueueSettings)
+    wastatus: WaStatusBufferSettings = field(default_factory=WaStatusBufferSettings)
+    wamid_index: WamidIndexSettings = field(default_factory=WamidIndexSettings)
+    audio: AudioSettings = field(default_factory=AudioSettings)
+    scratch: ScratchSettings = field(default_factory=ScratchSettings)
+    transcription_cache: TranscriptionCacheSettings = field(default_factory=TranscriptionCacheSettings)
+    journal_autosave: JournalAutosaveSettings = field(default_factory=JournalAutosaveSettings)
+    reports: ReportSettings = field(default_factory=ReportSettings)
     mediasettings: MediaDirSettings = field(default_factory=MediaDirSettings)
     
 
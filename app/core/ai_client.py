@@ -8,3 +8,9 @@ def get_openai_client():
     return openai
 
 client = get_openai_client()
+
+
+def get_async_openai_client():
+    # One per event loop: Celery tasks each run their own asyncio.run(), and the client's
+    # connection pool can't be shared across loops. Close it when the loop is done.
+    return openai.AsyncOpenAI(api_key=config.openai.api_key)
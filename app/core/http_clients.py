@@ -0,0 +1,39 @@
+# app/core/http_clients.py
+# One keep-alive client per upstream so replies reuse pooled (HTTP/2 where available) connections.
+import importlib.util, logging
+import httpx
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+GRAPH_MESSAGES = "graph_messages"  # POST /messages
+GRAPH_MEDIA = "graph_media"        # media metadata + uploads
+CDN = "cdn"                        # media downloads (lookaside.fbsbx.com) and other file fetches
+
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def get_http_client(name: str) -> httpx.AsyncClient:
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        settings = config.http
+        client = _clients[name] = httpx.AsyncClient(
+            http2=settings.http2 and _HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=settings.max_connections,
+                max_keepalive_connections=settings.max_keepalive_connections,
+                keepalive_expiry=settings.keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(settings.read_timeout, connect=settings.connect_timeout),
+        )
+    return client
+
+
+async def close_http_clients():
+    for name, client in list(_clients.items()):
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"Closing HTTP client {name} failed: {e}")
+    _clients.clear()
@@ -1,6 +1,19 @@
 # base.py
+import asyncio, contextvars
+from concurrent.futures import ThreadPoolExecutor
+from app.config import config
 from app.config.auth_config import supabase_client as supabase
 
+# supabase-py's .execute() is blocking; queries run here so the event loop stays free.
+_db_executor = ThreadPoolExecutor(max_workers=config.supabase.db_pool_size, thread_name_prefix="supabase-db")
+
+
+async def execute(query):
+    """Run a PostgREST query builder on the bounded DB pool, keeping the request context (JWT / role)."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_db_executor, ctx.run, query.execute)
+
 
 class TableProxy:
     """Proxy to lazily access Supabase tables with the current request context."""
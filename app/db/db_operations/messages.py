@@ -1,14 +1,20 @@
-from . import messages, logger, async_exception_handler, validate_data_presence
+from datetime import datetime, timedelta, timezone
+from app.config import config
+from app.config.auth_config import set_supabase_service_role
+from app.utils.dedupe import wamid_index
+from . import messages, logger, async_exception_handler, validate_data_presence, execute, supabase
+
+WARM_PAGE_SIZE = 1000
 
 async def update_msg_status(message_id: str, status: str, entry_id: str = None):
     """
     Try to update the status on an existing message. If no row was updated,
     fall back to inserting a minimal status‐only row (with defaults).
     """
-    resp = messages.update({
+    resp = await execute(messages.update({
         "status": status,
         "entry_id":entry_id
-    }).eq("wamid", message_id).execute()
+    }).eq("wamid", message_id))
 
     # if nothing was updated, insert a stub so we don't lose the status event
     if getattr(resp, "count", 0) == 0:
@@ -24,12 +30,68 @@ async def insert_msg_status(message_id: str, status: str):
       - role:         default to 'inbound'
       - source:       will default in the DB to 'whatsapp'
     """
-    messages.insert({
+    await execute(messages.insert({
         "wamid": message_id,
         "status": status,
         "message_type": "text",
         "role": "server"
-    }).execute()
+    }))
+    wamid_index.add(message_id)
+
+
+async def upsert_msg_statuses(statuses: list[dict]):
+    """
+    Write a batch of coalesced {"wamid", "status"} rows in one round trip.
+    The `upsert_msg_statuses(p_statuses jsonb)` function does
+    INSERT ... (wamid, status, message_type 'text', role 'server')
+    ON CONFLICT (wamid) DO UPDATE SET status = excluded.status
+    WHERE msg_status_rank(excluded.status) > msg_status_rank(whatsapp_messages.status),
+    so unseen wamids still get the same stub row insert_msg_status would have written, and a batch
+    landing late (or replayed after a restart) never moves a status backwards.
+    `msg_status_rank(text)` is the IMMUTABLE twin of status_buffer.STATUS_RANK:
+    sent 1, delivered 2, read 3, failed 4, anything else 0.
+    """
+    await execute(supabase.rpc("upsert_msg_statuses", {"p_statuses": statuses}))
+    for row in statuses:
+        wamid_index.add(row["wamid"])
+
+
+def build_message_payload(
+    user_id: str,
+    message_id: str,
+    msg_content: str,
+    incoming_tokens: int,
+    role: str,
+    status: str,
+    msg_type: str,
+    media_id: str = None,
+    media_url: str = None,
+    media_type: str = None,
+    media_filename: str = None,
+    source: str = None
+) -> dict:
+    payload = {
+        "wamid": message_id,
+        "user_id": user_id,
+        "message_content": msg_content,
+        "role": role,
+        "message_type": msg_type,
+        "tokens_used": incoming_tokens,
+        "status": status,
+    }
+    # only include media fields if provided
+    if media_id:
+        payload["media_id"] = media_id
+    if media_url:
+        payload["media_url"] = media_url
+    if media_type:
+        payload["media_type"] = media_type
+    if media_filename:
+        payload["media_filename"] = media_filename
+    # only override source if passed; otherwise rely on DB default
+    if source:
+        payload["source"] = source
+    return payload
 
 
 @async_exception_handler
@@ -53,33 +115,19 @@ async def insert_message(
     Adds optional media_url, media_type, media_filename.
     """
     try:
-        payload = {
-            "wamid": message_id,
-            "user_id": user_id,
-            "message_content": msg_content,
-            "role": role,
-            "message_type": msg_type,
-            "tokens_used": incoming_tokens,
-            "status": status,
-        }
-        # only include media fields if provided
-        if media_id:
-            payload["media_id"] = media_id
-        if media_url:
-            payload["media_url"] = media_url
-        if media_type:
-            payload["media_type"] = media_type
-        if media_filename:
-            payload["media_filename"] = media_filename
-        # only override source if passed; otherwise rely on DB default
-        if source:
-            payload["source"] = source
-
-        insert_msg_resp = messages.insert(payload).execute()
+        payload = build_message_payload(
+            user_id=user_id, message_id=message_id, msg_content=msg_content, incoming_tokens=incoming_tokens,
+            role=role, status=status, msg_type=msg_type, media_id=media_id, media_url=media_url,
+            media_type=media_type, media_filename=media_filename, source=source
+        )
+
+        insert_msg_resp = await execute(messages.insert(payload))
 
         # check for errors (Supabase-style)
         if 'message' in insert_msg_resp:
             logger.error(f"we have an issue inserting reply message to db: {insert_msg_resp}")
+        else:
+            wamid_index.add(message_id)
     except Exception as e:
         logger.error(f"Error inserting message into DB: {e}")
 
@@ -87,9 +135,55 @@ async def insert_message(
 async def msg_is_processed(wamid: str):
     """
     Returns truthy if we've already stored a message with this WAMID.
+    A warmed wamid_index answers "never seen" locally; only possible hits go to the DB.
+    """
+    if config.wamid_index.enabled and wamid_index.ready:
+        if not wamid_index.might_contain(wamid):
+            wamid_index.negatives += 1
+            return False
+        wamid_index.fallbacks += 1
+
+    resp = await execute(messages.select("wamid").eq("wamid", wamid))
+    processed = validate_data_presence(resp) # Bool, true or false
+    if processed:
+        wamid_index.add(wamid)
+    elif wamid_index.ready:
+        wamid_index.false_positives += 1
+    return processed
+
+
+async def warm_wamid_index():
     """
-    resp = messages.select("wamid").eq("wamid", wamid).execute()
-    return validate_data_presence(resp) # Bool, true or false
+    Load wamids stored within the index window so dedupe survives restarts.
+    Until this finishes the index is not ready and every check goes to the DB.
+    """
+    if not config.wamid_index.enabled:
+        return
+    set_supabase_service_role(True)
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=wamid_index.window_seconds)
+    loaded, start = 0, 0
+    try:
+        while True:
+            resp = await execute(messages
+                .select("wamid, created_at")
+                .gte("created_at", cutoff.isoformat())
+                .order("id")
+                .range(start, start + WARM_PAGE_SIZE - 1))
+            rows = resp.data or []
+            for row in rows:
+                if row.get("wamid"):
+                    wamid_index.add(row["wamid"], datetime.fromisoformat(row["created_at"]).timestamp())
+            loaded += len(rows)
+            if len(rows) < WARM_PAGE_SIZE:
+                break
+            start += WARM_PAGE_SIZE
+    except Exception as e:
+        logger.error(f"Warming wamid index failed, falling back to DB lookups: {e}")
+        return
+    finally:
+        set_supabase_service_role(False)
+    wamid_index.ready = True
+    logger.info(f"Wamid index warmed with {loaded} recent messages")
 
 
 @async_exception_handler
@@ -98,13 +192,12 @@ async def get_last_stt_msg(user_id: str):
     Fetch the most recent 'audio' message_content for this user.
     Decrypts before returning.
     """
-    resp = messages\
-        .select("message_content")\
-        .eq("user_id", user_id)\
-        .eq("message_type", "audio")\
-        .order("id", desc=True)\
-        .limit(1)\
-        .execute()
+    resp = await execute(messages
+        .select("message_content")
+        .eq("user_id", user_id)
+        .eq("message_type", "audio")
+        .order("id", desc=True)
+        .limit(1))
 
     if validate_data_presence(resp):
         return resp.data[0]["message_content"]
@@ -118,11 +211,10 @@ async def get_context_msg(context_msg_id: str):
     """
     Fetch and decrypt the single message with this WAMID.
     """
-    resp = messages\
-        .select("message_content")\
-        .eq("wamid", context_msg_id)\
-        .limit(1)\
-        .execute()
+    resp = await execute(messages
+        .select("message_content")
+        .eq("wamid", context_msg_id)
+        .limit(1))
 
     if validate_data_presence(resp):
         return resp.data[0]["message_content"]
@@ -1,8 +1,8 @@
-from . import prompts, logger, async_exception_handler, validate_data_presence
+from . import prompts, logger, async_exception_handler, validate_data_presence, execute
 
 @async_exception_handler
 async def get_prompt(command:str):
-    resp = prompts.select('prompt').eq('command', command).execute()
+    resp = await execute(prompts.select('prompt').eq('command', command))
     if validate_data_presence(resp):
         return resp.data[0]['prompt'] #returns the text value
     else:
@@ -1,13 +1,13 @@
-from . import subs, logger, validate_data_presence, async_exception_handler
+from . import subs, logger, validate_data_presence, async_exception_handler, execute
 
 #insert operations
 async def insert_sub_data(data:dict):
-    subs.insert(data).execute()
+    await execute(subs.insert(data))
 
 #update operations
 async def update_subscription(user_id:id, update_data:dict):
     try:
-        resp = subs.update(update_data).eq('user_id', user_id).execute()
+        resp = await execute(subs.update(update_data).eq('user_id', user_id))
         if validate_data_presence(resp):
             return resp.data[0]
         else:
@@ -19,7 +19,7 @@ async def update_subscription(user_id:id, update_data:dict):
         
 async def update_sub_data(data:dict, user_id:int=None):
     try:
-        resp = subs.update(data).eq('user_id', user_id).execute()
+        resp = await execute(subs.update(data).eq('user_id', user_id))
         if validate_data_presence(resp):
             return resp.data[0]
         else:
@@ -31,7 +31,7 @@ async def update_sub_data(data:dict, user_id:int=None):
     
 async def update_sub_data_sub_id(data:dict, sub_id:str):
     try:
-        resp = subs.update(data).eq('sub_id', sub_id).execute()
+        resp = await execute(subs.update(data).eq('sub_id', sub_id))
         if validate_data_presence(resp):
             return resp.data[0]
         else:
@@ -42,11 +42,11 @@ async def update_sub_data_sub_id(data:dict, sub_id:str):
         return None       
 
 async def update_token_data(new_monthly_total:int, new_total:int, new_daily_total:int, user_id:int):
-    subs.update({'tokens_used_month': new_monthly_total, 'total_tokens_used': new_total, 'tokens_used_day': new_daily_total}).eq('user_id', user_id).execute()
+    await execute(subs.update({'tokens_used_month': new_monthly_total, 'total_tokens_used': new_total, 'tokens_used_day': new_daily_total}).eq('user_id', user_id))
 
 async def update_subscription_settings(user_id:int, cleaned_data):
     try:
-        resp = subs.update({'subscription': cleaned_data['subscription']}).eq('user_id', user_id). execute()
+        resp = await execute(subs.update({'subscription': cleaned_data['subscription']}).eq('user_id', user_id))
         if validate_data_presence(resp):
             return resp.data[0]
         else:
@@ -59,7 +59,7 @@ async def update_subscription_settings(user_id:int, cleaned_data):
 # fetch operations
 async def get_sub_data_sub_id(sub_id:int):
     try:
-        resp = subs.select('*').eq('sub_id', sub_id).execute()
+        resp = await execute(subs.select('*').eq('sub_id', sub_id))
         if validate_data_presence(resp):
             return resp.data[0]
         else:
@@ -71,7 +71,7 @@ async def get_sub_data_sub_id(sub_id:int):
     
 @async_exception_handler
 async def get_consumption(user_id:int):
-    resp = subs.select('*').eq('user_id', user_id).execute()
+    resp = await execute(subs.select('*').eq('user_id', user_id))
     if validate_data_presence(resp):
         logger.info(f'resp update consumption data: {resp}')
         return resp.data[0]
@@ -81,11 +81,11 @@ async def get_consumption(user_id:int):
     
 @async_exception_handler
 async def update_consumption_data(consumption_data:dict, user_id:int):
-    resp = subs.update(consumption_data).eq('user_id', user_id).execute()
+    resp = await execute(subs.update(consumption_data).eq('user_id', user_id))
     
 async def get_token_usage_data(user_id:int):
     try:
-        resp = subs.select('token_usage', 'token_limit').eq('user_id', user_id).execute()
+        resp = await execute(subs.select('token_usage', 'token_limit').eq('user_id', user_id))
         if validate_data_presence(resp):
             return resp.data[0]
         else:
@@ -97,7 +97,7 @@ async def get_token_usage_data(user_id:int):
     
 async def get_subscription_type(user_id:int):
     try:
-        resp = subs.select('subscription').eq('user_id', user_id).execute()
+        resp = await execute(subs.select('subscription').eq('user_id', user_id))
         if validate_data_presence(resp):
             return resp.data[0]
         else:
@@ -109,7 +109,7 @@ async def get_subscription_type(user_id:int):
     
 async def get_sub_trial_data_user_id(user_id:int):
     try:
-        resp = subs.select('sub_id', 'trial', 'end_date', 'active', 'subscription').eq('user_id', user_id).execute()
+        resp = await execute(subs.select('sub_id', 'trial', 'end_date', 'active', 'subscription').eq('user_id', user_id))
         if validate_data_presence(resp):
             return resp.data[0]
         else:
@@ -121,7 +121,7 @@ async def get_sub_trial_data_user_id(user_id:int):
     
 async def sub_active(user_id):
     try:
-        sub_active = subs.select('active').eq('user_id', user_id).execute()
+        sub_active = await execute(subs.select('active').eq('user_id', user_id))
         if validate_data_presence(sub_active):
             return sub_active.data[0]['active']
         else:
@@ -132,7 +132,7 @@ async def sub_active(user_id):
 
 async def get_active_subs():
     try:
-        resp = subs.select('user_id').eq('active', True).execute()
+        resp = await execute(subs.select('user_id').eq('active', True))
         if validate_data_presence(resp):
             return resp.data
         else:
@@ -144,7 +144,7 @@ async def get_active_subs():
 # utility operations
 async def reset_token_counter(user_id:int):
     try:
-        resp = subs.update({"token_usage": int(0)}).eq("user_id", user_id).execute()
+        resp = await execute(subs.update({"token_usage": int(0)}).eq("user_id", user_id))
         if validate_data_presence(resp):
             return resp.data[0]
         else:
@@ -156,7 +156,7 @@ async def reset_token_counter(user_id:int):
     
 async def invalidate_sub(user_id:int):
     try:
-        resp = subs.update({'active': False}).eq('user_id', user_id).execute()
+        resp = await execute(subs.update({'active': False}).eq('user_id', user_id))
         if validate_data_presence(resp):
             return {"status": "success"}
         else:
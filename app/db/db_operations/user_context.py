@@ -0,0 +1,42 @@
+from app.utils.dedupe import wamid_index
+from . import logger, execute, supabase
+
+
+async def get_wa_user_context(phone_number: str):
+    """
+    One round trip for everything the WhatsApp hot path needs about the sender.
+    `get_wa_user_context(p_phone_number text)` returns the same shape as get_user_from_number
+    ({"user_id", "users": {..., "user_settings": {"tz_offset"}, "subscriptions": [...]}}) plus
+    "today_entry_id": the journal_entries id for the user's local date, or null.
+    Returns None when the number is not linked to a user.
+    """
+    resp = await execute(supabase.rpc("get_wa_user_context", {"p_phone_number": phone_number}))
+    data = resp.data
+    if isinstance(data, list):
+        data = data[0] if data else None
+    if not data or not data.get("user_id"):
+        logger.info(f"No user found for phone number {phone_number}")
+        return None
+    return data
+
+
+async def commit_wa_user_context(params: dict):
+    """
+    Write back a message's accumulated changes in a single transaction and return the journal entry id.
+    `commit_wa_user_context` takes:
+      p_user_id, p_usage_delta, p_message_count_delta, p_reset_message_count (bool), p_last_reset,
+      p_entry_date, p_journal_content, p_word_delta, p_messages (jsonb rows, the inbound message first),
+      p_inbound_wamid.
+    It is idempotent on p_inbound_wamid: it first takes `SELECT status, entry_id FROM whatsapp_messages
+    WHERE wamid = p_inbound_wamid FOR UPDATE` and, when that row is already 'processed', returns its
+    entry_id without writing anything, so a resend after a timeout can't apply the message twice.
+    Otherwise it bumps the subscriptions counters, upserts journal_entries on (user_id, entry_date) appending
+    p_journal_content (word_count += p_word_delta, version += 1, preview kept as append_journal_entry does), inserts p_messages ON CONFLICT (wamid) DO UPDATE (a coalesced status may
+    already have written a stub row), and marks p_inbound_wamid processed with the entry id.
+    """
+    resp = await execute(supabase.rpc("commit_wa_user_context", params))
+    for row in params.get("p_messages") or []:
+        wamid_index.add(row["wamid"])
+    if params.get("p_inbound_wamid"):
+        wamid_index.add(params["p_inbound_wamid"])
+    return resp.data
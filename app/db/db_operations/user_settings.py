@@ -1,10 +1,12 @@
-from . import user_settings, logger, validate_data_presence, async_exception_handler
+from . import user_settings, logger, validate_data_presence, async_exception_handler, execute
+from app.utils.cache import invalidate_user_profile
 
 
 @async_exception_handler
 async def update_user_settings(data:dict, user_id:str):
     try:
-        resp = user_settings.update(data).eq("user_id", user_id).execute()
+        resp = await execute(user_settings.update(data).eq("user_id", user_id))
+        invalidate_user_profile(user_id=user_id)
     except Exception as e:
         logger.error(f"Error updating user settings for user {user_id}: {e}")
         return False
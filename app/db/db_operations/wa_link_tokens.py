@@ -1,10 +1,10 @@
-from . import whatsapp_link_tokens, logger, validate_data_presence, async_exception_handler
+from . import whatsapp_link_tokens, logger, validate_data_presence, async_exception_handler, execute
 
 async def get_user_id_from_token(token: str):
     """
     Fetch the user ID associated with a given link token.
     """
-    resp = whatsapp_link_tokens.select("*").eq("token", token).eq('valid', True).limit(1).execute()
+    resp = await execute(whatsapp_link_tokens.select("*").eq("token", token).eq('valid', True).limit(1))
     
     if validate_data_presence(resp):
         return resp.data[0]
@@ -14,7 +14,7 @@ async def get_user_id_from_token(token: str):
     
 @async_exception_handler
 async def update_token_validity(now, token:str):
-    resp = whatsapp_link_tokens.update({ "consumed_at": now, "valid": False }).eq("id", token).execute()
+    resp = await execute(whatsapp_link_tokens.update({ "consumed_at": now, "valid": False }).eq("id", token))
     if not validate_data_presence(resp):
         logger.error(f"Failed to update token validity for {token}")
         return False
@@ -1,28 +1,46 @@
-from fastapi import Request
-from fastapi.responses import RedirectResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+import re
+from starlette.requests import Request
+from starlette.responses import RedirectResponse
 from urllib.parse import urlencode
 
 PUBLIC_PATHS = {"/", "/sign-in", "/sign-up", "finish-sign-up", "/recovery", "/password-reset", "/terms-of-service", "/privacy", "/refund", "/contact"}  # Add any public paths
+BYPASS_PATHS = ("/static", "/wa/whatsapp")  # never need cookie or JWT work
 
-class AuthRedirectMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        path = request.url.path
 
-        # Skip check for public paths and static files
-        if any(path.startswith(p) for p in PUBLIC_PATHS) or path.startswith("/static"):
-            return await call_next(request)
+def compile_prefix_matcher(prefixes) -> re.Pattern:
+    """One anchored alternation instead of a startswith() scan; longest prefixes first."""
+    return re.compile("|".join(re.escape(p) for p in sorted(prefixes, key=len, reverse=True)))
+
+
+BYPASS_PATH_RE = compile_prefix_matcher(BYPASS_PATHS)
+PUBLIC_PATH_RE = compile_prefix_matcher(PUBLIC_PATHS)
+
+
+class AuthRedirectMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        path = scope["path"]
+
+        # Skip check for static files, the webhook and public paths
+        if BYPASS_PATH_RE.match(path) or PUBLIC_PATH_RE.match(path):
+            return await self.app(scope, receive, send)
 
         # Attempt to get and validate the access token
+        request = Request(scope)
         token = request.cookies.get("access_token")
-        user = None
         if token:
             from app.modules.services.auth.auth_utils import AuthenticationUtils
-            decoded_token = AuthenticationUtils.decode_and_validate_jwt(token)
+            decoded_token = AuthenticationUtils.get_request_jwt_claims(request, token)
             if decoded_token and "sub" in decoded_token:
                 request.state.user_sub = decoded_token["sub"]
-                return await call_next(request)
+                return await self.app(scope, receive, send)
 
         # Redirect to /sign_in with ?next param
         next_url = urlencode({"next": str(path)})
-        return RedirectResponse(f"/sign_in?{next_url}")
+        response = RedirectResponse(f"/sign_in?{next_url}")
+        await response(scope, receive, send)
@@ -1,18 +1,34 @@
 # app/middleware/user_cookie_injector.py
 
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import MutableHeaders
 from starlette.responses import Response
+from app.middleware.auth_redirect_middleware import BYPASS_PATH_RE
 
-class UserDataCookieMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        response: Response = await call_next(request)
-        user_cookie = getattr(request.state, "set_user_cookie", None)
-        if user_cookie:
-            response.set_cookie(
-                key=user_cookie["key"],
-                value=user_cookie["value"],
-                httponly=user_cookie["httponly"],
-                secure=user_cookie["secure"],
-                max_age=user_cookie["max_age"]
-            )
-        return response
+class UserDataCookieMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or BYPASS_PATH_RE.match(scope["path"]):
+            return await self.app(scope, receive, send)
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start":
+                user_cookie = scope.get("state", {}).get("set_user_cookie")
+                if user_cookie:
+                    # Let Starlette format the cookie, then copy the header onto the real response
+                    cookie_response = Response()
+                    cookie_response.set_cookie(
+                        key=user_cookie["key"],
+                        value=user_cookie["value"],
+                        httponly=user_cookie["httponly"],
+                        secure=user_cookie["secure"],
+                        max_age=user_cookie["max_age"]
+                    )
+                    headers = MutableHeaders(scope=message)
+                    for name, value in cookie_response.raw_headers:
+                        if name == b"set-cookie":
+                            headers.append("set-cookie", value.decode("latin-1"))
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
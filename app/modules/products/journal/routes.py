@@ -1,6 +1,6 @@
 # app/modules/products/journal/routes.py
 # endpoint is /api/journal
-import logging, asyncio, websockets, json
+import logging, asyncio, websockets, json, base64, uuid
 from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.requests import Request
 from fastapi.responses import JSONResponse
@@ -16,15 +16,20 @@ from app.modules.services.ai.chatgpt_messaging import send_message_to_chatgpt
 
 from app.modules.services.journal.journal_services import (
     get_or_create_today_entry,
-    update_journal_entry,
-    get_journal_entry_by_id
+    get_journal_entry_by_id,
+    build_entry_preview,
+    archive_count_cache,
+    forget_archive_count
 )
+from app.modules.services.journal.autosave_buffer import autosave_buffer, JournalVersionConflict, JournalEntryNotFound
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 class JournalUpdatePayload(BaseModel):
     content: str
+    version: int
+    flush: bool = False  # write on the next tick instead of waiting out the debounce (manual save, leaving the page)
 
 class TodayJournalRequest(BaseModel):
     local_date: str
@@ -47,7 +52,7 @@ async def fetch_or_create_today_journal(
     local_date = payload.local_date
 
 
-    entry = await get_or_create_today_entry(user_id=user_id, local_date=local_date)
+    entry = autosave_buffer.overlay(await get_or_create_today_entry(user_id=user_id, local_date=local_date), user_id)
     # Parse the ISO date string (e.g., "2025-06-14")
     entry_date_obj = datetime.strptime(entry["entry_date"], "%Y-%m-%d").date()
 
@@ -56,6 +61,8 @@ async def fetch_or_create_today_journal(
         "entry_date": entry["entry_date"],
         "entry_date_display": entry_date_obj.strftime("%A, %B %d, %Y"),
         "content": entry.get("content", ""),
+        "version": entry.get("version", 0),
+        "unsaved_content": autosave_buffer.take_conflict(entry["id"], user_id),
     }
 
 
@@ -71,7 +78,7 @@ async def get_recent_journal_entries(
     # Fetch up to 3 most recent entries, including today
     res = (
         supabase.table("journal_entries")
-        .select("id, content, entry_date")
+        .select("id, preview, entry_date")
         .eq("user_id", user_id)
         .lte("entry_date", today_str)
         .order("entry_date", desc=True)
@@ -85,7 +92,7 @@ async def get_recent_journal_entries(
             entries.append(
                 {
                     "id": entry["id"],
-                    "preview": entry["content"][:120].split("\n")[0].strip() + "...",
+                    "preview": (entry["preview"] or "") + "...",
                     "entry_date": entry["entry_date"],
                     "label": format_entry_label(entry["entry_date"]),
                 }
@@ -95,31 +102,56 @@ async def get_recent_journal_entries(
 
 @router.get("/all_dates")
 async def get_all_entry_dates(
+    format: str = "list",
+    start: date = None,
+    end: date = None,
     current_user=Depends(AuthenticationUtils.get_authenticated_user)
 ):
-    logger.info("in all_dates")
+    """
+    Distinct dates the user has an entry for, within [start, end] when given (the calendar asks one
+    month at a time). format=bitmap returns {"months": {"YYYY-MM": mask}} instead, where bit (day - 1)
+    of mask is set when that day has an entry - one small int per month.
+    """
     user_id = current_user["id"]
-    print(f'user_id at /all_dates: {user_id}')
 
-    entries = (
+    query = (
         supabase.table("journal_entries")
-        .select("created_at", "entry_date")
+        .select("entry_date")
         .eq("user_id", user_id)
-        .order("created_at", desc=True)
-        .execute()
     )
-    print(f"entries: {entries}")
+    if start:
+        query = query.gte("entry_date", start.isoformat())
+    if end:
+        query = query.lte("entry_date", end.isoformat())
+    entries = query.order("entry_date", desc=True).execute()
 
     if not validate_data_presence(entries):
-        return {"dates": []}
+        return {"months": {}} if format == "bitmap" else {"dates": []}
 
-    return {
-        "dates": [
-            # entry["created_at"].split("T")[0]  # Extract date part from serverdata
-            entry["entry_date"]  # from entry date, local to user
-            for entry in entries.data
-        ]
-    }
+    # one entry per (user_id, entry_date) already; PostgREST has no DISTINCT, so make sure here
+    dates = sorted({entry["entry_date"] for entry in entries.data}, reverse=True)  # from entry date, local to user
+
+    if format == "bitmap":
+        months = {}
+        for entry_date in dates:
+            month, day = entry_date[:7], int(entry_date[8:10])
+            months[month] = months.get(month, 0) | (1 << (day - 1))
+        return {"months": months}
+
+    return {"dates": dates}
+
+
+def encode_archive_cursor(entry: dict) -> str:
+    return base64.urlsafe_b64encode(f"{entry['created_at']}|{entry['id']}".encode()).decode()
+
+
+def decode_archive_cursor(cursor: str) -> tuple[str, str]:
+    """(created_at, id) re-serialized from parsed values, so nothing from the client reaches the filter verbatim."""
+    try:
+        created_at, entry_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(created_at).isoformat(), str(uuid.UUID(entry_id))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @router.get("/paginated")
@@ -127,40 +159,48 @@ async def get_paginated_journal_entries(
     request: Request,
     page: int = 1,
     limit: int = 10,
+    cursor: str = None,
     current_user=Depends(AuthenticationUtils.get_authenticated_user)
 ):
-    logger.info("in all_dates")
+    """
+    Keyset pagination on (created_at, id), newest first: pass the returned next_cursor to get the
+    following page. `page` without a cursor still works (offset) for older clients.
+    The total is counted by the first query that finds no cached count and kept until an entry is created.
+    """
     user_id = current_user["id"]
-    print(f'user_id at /paginated: {user_id}')
-
 
     MAX_LIMIT = 25
     limit = min(limit, MAX_LIMIT)
-    offset = (page - 1) * limit
 
-    # Count total entries
-    count_res = supabase.table("journal_entries") \
-        .select("id", count="exact") \
-        .eq("user_id", user_id) \
-        .execute()
-    total_entries = count_res.count or 0
-
-    # Fetch paginated results
-    data_res = supabase.table("journal_entries") \
-        .select("id, content, created_at, word_count") \
-        .eq("user_id", user_id) \
-        .order("created_at", desc=True) \
-        .range(offset, offset + limit - 1) \
-        .execute()
-    
-    print(f'data res from /paginated: {data_res}')
+    total_entries = archive_count_cache.get(str(user_id))
+    query = supabase.table("journal_entries") \
+        .select("id, preview, created_at, word_count", count="exact" if total_entries is None else None) \
+        .eq("user_id", user_id)
+    if cursor:
+        created_at, entry_id = decode_archive_cursor(cursor)
+        query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{entry_id})')
+    query = query.order("created_at", desc=True).order("id", desc=True)
+    if cursor or page <= 1:
+        # one extra row tells us whether there is a next page
+        data_res = query.limit(limit + 1).execute()
+    else:
+        offset = (page - 1) * limit
+        data_res = query.range(offset, offset + limit).execute()
+
+    if total_entries is None:
+        total_entries = data_res.count or 0
+        archive_count_cache.set(str(user_id), total_entries)
+
+    rows = data_res.data or []
+    has_more = len(rows) > limit
+    rows = rows[:limit]
 
     entries = []
-    for entry in data_res.data or []:
+    for entry in rows:
         date_str = entry["created_at"].split("T")[0]
         entries.append({
             "id": entry["id"],
-            "preview": entry["content"][:120].split("\n")[0].strip() + "...",
+            "preview": (entry["preview"] or "") + "...",
             "word_count": entry["word_count"],
             "entry_date": date_str,
             "label": format_entry_label(date_str)
@@ -170,6 +210,7 @@ async def get_paginated_journal_entries(
         "entries": entries,
         "page": page,
         "limit": limit,
+        "next_cursor": encode_archive_cursor(rows[-1]) if has_more else None,
         "total": total_entries,
         "total_pages": (total_entries + limit - 1) // limit
     }
@@ -182,11 +223,13 @@ async def open_journal_entry(
     user=Depends(AuthenticationUtils.get_authenticated_user),
 ):
     try:
-        entry = await get_journal_entry_by_id(entry_id, user["id"])
+        entry = autosave_buffer.overlay(await get_journal_entry_by_id(entry_id, user["id"]), user["id"])
 
         logger.info(f'entry we got: {entry}')
         if not entry:
             raise HTTPException(status_code=404, detail="Entry not found")
+        # text of an autosave that lost a version race, so the editor can put it back
+        entry["unsaved_content"] = autosave_buffer.take_conflict(entry_id, user["id"])
 
         # entry_date_obj = datetime.strptime(entry["entry_date"], "%Y-%m-%d").date()
 
@@ -213,10 +256,19 @@ async def update_entry(
     payload: JournalUpdatePayload,
     current_user=Depends(AuthenticationUtils.get_authenticated_user),
 ):
-    success = await update_journal_entry(entry_id, current_user["id"], payload.content)
-    if not success:
-        raise HTTPException(status_code=403, detail="Update failed")
-    return {"status": "save ok"}
+    try:
+        version = await autosave_buffer.save(
+            entry_id, current_user["id"], payload.content, payload.version, flush=payload.flush
+        )
+    except JournalEntryNotFound:
+        raise HTTPException(status_code=404, detail="Entry not found")
+    except JournalVersionConflict as e:
+        raise HTTPException(status_code=409, detail={
+            "message": str(e),
+            "version": e.version,
+            "unsaved_content": e.unsaved_content,
+        })
+    return {"status": "save ok", "version": version}
 
 
 @router.post("/reflect")
@@ -369,6 +421,7 @@ async def create_mock_entries_dev(
                         "entry_date": entry_date,
                         "content": preview,
                         "word_count": len(preview.split()),
+                        "preview": build_entry_preview(preview),
                     }
                 )
                 .execute()
@@ -376,4 +429,6 @@ async def create_mock_entries_dev(
             if insert.data:
                 entries.append(insert.data[0])
 
+    if entries:
+        forget_archive_count(user_id)
     return {"status": "created", "entries": entries}
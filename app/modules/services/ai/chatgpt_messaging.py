@@ -1,15 +1,19 @@
-import asyncio, logging, aiofiles
+import asyncio, logging, os
 from app.config.openai_config import client
 from aiohttp import ClientError
 
 from .chatgpt_services import calc_tokens, is_within_model_lim
 from app.config.general_config import OpenAISettings, SubscriptionVariables
 from app.utils.common_utils import async_exception_handler
-from pydub.utils import mediainfo
+from app.config import config
+from app.modules.voice.audio_pipeline import probe_duration, split_audio, stitch_transcripts
 
 
 logger = logging.getLogger(__name__)
 
+# caps concurrent Whisper requests across all voice notes in this process
+_stt_slots = asyncio.Semaphore(config.audio.stt_max_concurrency)
+
 async def fetch_gpt_response(chat_messages, max_tokens, model):
     try:
         response = await client.chat.completions.create(
@@ -76,42 +80,50 @@ async def send_message_to_chatgpt(message_content:dict, user_data:dict):
     return gpt_response, incoming_tokens
 
 
+def stt_limit_response(duration: float, free: bool) -> dict | None:
+    if free and duration >= SubscriptionVariables.free_message_length_limit:
+        message = 'Message is longer than 60 seconds. Please upgrade to transcribe longer messages. \n\nType \'*/upgrade*\' to see your options.'
+        return {"status": "limit", "data": message, "duration": 0.00}
+    return None
+
+
+async def transcribe_file(audio_file_path: str) -> str:
+    # The file goes to the API as-is; Whisper reads the format from the file name
+    async with _stt_slots:
+        with open(audio_file_path, "rb") as audio_file:
+            return await client.audio.transcriptions.create(
+                model="whisper-1",
+                file=audio_file,
+                response_format="text"
+            )
+
+
 @async_exception_handler
-async def perform_stt(mp3_file_path, free:bool=False) -> dict:
+async def perform_stt(audio_file_path, free:bool=False, duration: float = None) -> dict:
     logger.info("in perform STT")
-    duration = 0.00
     try:
-        # Get the file length in seconds
-        audio_info = mediainfo(mp3_file_path)
-        logger.info(f'audio_info: {audio_info}')
-        duration = float(audio_info.get('duration'))
+        # Get the file length in seconds (from the container headers when possible)
+        if duration is None:
+            duration = await probe_duration(audio_file_path)
         logger.info(f"Audio duration: {duration} seconds")
         
-        if free and duration >= SubscriptionVariables.free_message_length_limit:
-            duration = 0.00
-            message = 'Message is longer than 60 seconds. Please upgrade to transcribe longer messages. \n\nType \'*/upgrade*\' to see your options.'
-            return {"status": "limit", "data": message, "duration": duration}
-
-        # Chunk size in bytes
-        chunk_size = 5 * 1024 * 1024  # 5 MB
-
-        # Use aiofiles to read the file in chunks and write to a combined file
-        combined_file_path = "./tmp/combined_audio.mp3"
-        async with aiofiles.open(mp3_file_path, "rb") as audio_file, aiofiles.open(combined_file_path, "wb") as combined_file:
-            while True:
-                chunk = await audio_file.read(chunk_size)
-                if not chunk:
-                    break
-                await combined_file.write(chunk)
-
-        # Use synchronous file handling for the OpenAI API
-        with open(combined_file_path, "rb") as audio_file:
-            transcription = await client.audio.transcriptions.create(
-                model="whisper-1", 
-                file=audio_file,
-                response_format="text"
+        limit_resp = stt_limit_response(duration, free)
+        if limit_resp:
+            return limit_resp
+
+        too_big = os.path.getsize(audio_file_path) > config.audio.stt_max_file_mb * 1024 * 1024
+        if duration > config.audio.stt_chunk_threshold or too_big:
+            # Long notes: overlapping windows transcribed concurrently, so latency is about one window's
+            segments = await split_audio(
+                audio_file_path, duration, os.path.dirname(audio_file_path),
+                window=config.audio.stt_chunk_seconds, overlap=config.audio.stt_chunk_overlap
             )
-            logger.info("transcription: [redacted]")  # this is text output, is all we need to use.
+            logger.info(f"Transcribing {len(segments)} segments of {audio_file_path}")
+            parts = await asyncio.gather(*(transcribe_file(segment) for segment in segments))
+            transcription = stitch_transcripts(parts)
+        else:
+            transcription = await transcribe_file(audio_file_path)
+        logger.info("transcription: [redacted]")  # this is text output, is all we need to use.
 
         return {"status": "success", "data": transcription, "duration": duration}
     except Exception as e:
@@ -1,46 +1,67 @@
-import logging, os
-from .chatgpt_messaging import perform_stt, perform_tts
-from app.utils.common_utils import async_exception_handler, generate_filename, convert_media
+import asyncio, logging, os
+from .chatgpt_messaging import perform_stt, perform_tts, stt_limit_response
+from app.utils.common_utils import async_exception_handler, generate_filename
+from app.modules.voice.audio_pipeline import prepare_for_transcription, transcode
 from app.modules.services.whatsapp.whatsapp_utils import get_media_url, download_media
+from app.config import config
 from app.config.general_config import MediaDirSettings
+from app.utils.scratch_space import scratch_space
+from app.utils.transcription_cache import transcription_cache, file_sha256
 
 logger = logging.getLogger(__name__)
 
 
 @async_exception_handler
-async def transcribe_audio(audio_id: str, message_id: str, mime_type: str = None, user_data: dict = None):
-    media_url = await get_media_url(media_id=audio_id)
+async def transcribe_audio(audio_id: str, message_id: str, mime_type: str = None, user_data: dict = None, audio_sha256: str = None, media_url: str = None):
+    free = user_data['users']['subscriptions'][0]['subscription'] == 'free'
+    use_cache = config.transcription_cache.enabled
+
+    # Same media hash -> same words; skip download, conversion and STT entirely
+    cached = transcription_cache.get(audio_sha256) if use_cache else None
+    if cached:
+        logger.info(f"Transcription cache hit for media {audio_id}")
+        return stt_limit_response(cached['duration'], free) or {'status': 'success', **cached}
+
+    media_url = media_url or await get_media_url(media_id=audio_id)
     if not media_url:
         logger.error("Failed to get media URL for media ID: %s", audio_id)
         return {'status': 'error'}
 
     logger.info(f"media_url: {media_url}")
 
-    # Download as OGG
-    ogg_in_filename = generate_filename(message_id=message_id, audio_id=audio_id, extension=mime_type.split('/')[1].split(';')[0])
-    ogg_in_file_path = os.path.join(MediaDirSettings.incoming_ogg_dir, ogg_in_filename)
+    # Everything for this voice note lives in its own scratch dir, removed when the block exits
+    async with scratch_space.job("stt", reserve_bytes=config.scratch.audio_reserve_mb * 1024 * 1024) as job:
+        # Download as OGG
+        ogg_in_filename = generate_filename(message_id=message_id, audio_id=audio_id, extension=mime_type.split('/')[1].split(';')[0])
+        ogg_in_file_path = job.path(ogg_in_filename)
 
-    download_status = await download_media(url=media_url, file_path=ogg_in_file_path)
-    if download_status['status'] != "success":
-        return {'status': 'error'}
+        download_status = await download_media(url=media_url, file_path=ogg_in_file_path)
+        if download_status['status'] != "success":
+            return {'status': 'error'}
 
-    conversion_result = await convert_media(file_path=ogg_in_file_path, target_format="mp3", output_dir=MediaDirSettings.incoming_mp3_dir)
-    if conversion_result['status'] != "success":
-        return {'status': 'error'}
-    mp3_in_file_path = conversion_result['file_path']
+        if use_cache and not audio_sha256:
+            audio_sha256 = await asyncio.to_thread(file_sha256, ogg_in_file_path)
+            cached = transcription_cache.get(audio_sha256)
+            if cached:
+                return stt_limit_response(cached['duration'], free) or {'status': 'success', **cached}
+
+        # OGG/Opus and the other Whisper formats go through untouched; only others are transcoded to mp3
+        prepared = await prepare_for_transcription(file_path=ogg_in_file_path, output_dir=job.dir)
+        if prepared['status'] != "success":
+            return {'status': 'error'}
 
-    # Perform speech-to-text
-    transcribed_message_resp = await perform_stt(mp3_in_file_path, user_data['users']['subscriptions'][0]['subscription'] == 'free')
+        # Perform speech-to-text
+        transcribed_message_resp = await perform_stt(prepared['file_path'], free, duration=prepared['duration'])
     if transcribed_message_resp['status'] == "error":
         return {'status': 'error'}
+    if use_cache and transcribed_message_resp['status'] == "success":
+        transcription_cache.set(audio_sha256, transcribed_message_resp['data'], transcribed_message_resp['duration'])
     
     logger.info(f"transcribed message: {transcribed_message_resp['data'][:50]}, length: {transcribed_message_resp['duration']}")
     
     return {
         'status': transcribed_message_resp['status'],
         'data': transcribed_message_resp['data'],
-        'ogg_in_file_path': ogg_in_file_path,
-        'mp3_in_file_path': mp3_in_file_path,
         'duration': transcribed_message_resp['duration']
     }
 
@@ -54,7 +75,7 @@ async def generate_audio_response(reply_message_gpt:str, message_id:str, audio_i
     if tts_status['status'] != "success":
         return {'status': 'error'}
 
-    mp3_conv_status = await convert_media(mp3_out_file_path, "ogg", MediaDirSettings.outgoing_ogg_dir)
+    mp3_conv_status = await transcode(mp3_out_file_path, "ogg", MediaDirSettings.outgoing_ogg_dir)
     if mp3_conv_status['status'] != 'success':
         return {'status': 'error'}
     
@@ -17,6 +17,7 @@ from app.config.auth_config import (
 )
 from app.utils.common_utils import validate_data_presence
 from app.utils.helpers import parse_user_data_cookie
+from app.utils.cache import user_profile_cache
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +33,16 @@ class AuthenticationUtils:
             logging.error(f"JWT decoding/validation error: {e}")
             return None
 
+    @staticmethod
+    def get_request_jwt_claims(request: Request, token: str) -> dict | None:
+        """Decode the token once per request; middleware and dependencies share the result via request.state."""
+        cached = getattr(request.state, "jwt_claims", None)
+        if cached is not None and cached[0] == token:
+            return cached[1]
+        decoded_token = AuthenticationUtils.decode_and_validate_jwt(token)
+        request.state.jwt_claims = (token, decoded_token)
+        return decoded_token
+
     @staticmethod
     def get_user_auth_status(request: Request) -> dict:
         jwt_token = request.cookies.get('access_token')
@@ -56,7 +67,7 @@ class AuthenticationUtils:
             logger.info("No access token provided")
             return None
 
-        decoded_token = AuthenticationUtils.decode_and_validate_jwt(access_token)
+        decoded_token = AuthenticationUtils.get_request_jwt_claims(request, access_token)
         if not decoded_token:
             set_supabase_access_token(None)
             if require_auth:
@@ -71,14 +82,26 @@ class AuthenticationUtils:
             logger.info("Token payload missing 'sub'")
             return None
 
+        # ✅ Already resolved earlier in this request
+        memo = getattr(request.state, "auth_user", None)
+        if memo is not None and memo.get("sub") == auth_user_id:
+            return memo
+
         # ✅ Try cookie if allowed
         if allow_cookie:
             raw_cookie = request.cookies.get("user_data")
             user_data = parse_user_data_cookie(raw_cookie)
             if user_data and user_data.get("sub") == auth_user_id:
                 logger.info(f'user_data from cookie: {user_data}')
+                request.state.auth_user = user_data
                 return user_data
 
+        # ♻️ Then the process-wide profile cache
+        user_data = user_profile_cache.get(auth_user_id)
+        if user_data is not None:
+            request.state.auth_user = user_data
+            return user_data
+
         # 🧠 Otherwise fetch from Supabase
         user_result = supabase.table("users").select("*, user_settings(tz_offset)").eq("sub", auth_user_id).single().execute()
         logger.info(f'user_results: {user_result}')
@@ -90,6 +113,8 @@ class AuthenticationUtils:
             return None
 
         logger.info(f"Authenticated user: {user_result.data}")
+        user_profile_cache.set(auth_user_id, user_result.data)
+        request.state.auth_user = user_result.data
         return user_result.data
 
 
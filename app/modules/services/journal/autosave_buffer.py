@@ -0,0 +1,190 @@
+# autosave_buffer.py
+# The web editor autosaves the whole entry every few seconds while someone types. Keep the latest
+# content per entry in memory and write it once the editor goes idle (or max_delay has passed),
+# guarded by journal_entries.version so a stale tab gets a 409 instead of overwriting newer text.
+import asyncio, logging, time
+from dataclasses import dataclass
+from app.config import config
+from app.config.auth_config import set_supabase_service_role
+from app.modules.services.journal.journal_services import update_journal_entry, build_entry_preview, get_journal_entry_version
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class JournalVersionConflict(Exception):
+    def __init__(self, entry_id: str, version: int | None = None, unsaved_content: str | None = None):
+        super().__init__(f"Journal entry {entry_id} was changed elsewhere")
+        self.entry_id = entry_id
+        self.version = version
+        self.unsaved_content = unsaved_content  # buffered text that lost the race and was never written
+
+
+class JournalEntryNotFound(Exception):
+    pass
+
+
+@dataclass
+class PendingSave:
+    user_id: str
+    content: str
+    base_version: int  # version the row has in the database
+    version: int  # version handed to the client for its latest save
+    first_at: float
+    last_at: float
+
+
+class JournalAutosaveBuffer:
+    def __init__(self, debounce: float, max_delay: float, tick: float, conflict_ttl: float, max_conflicts: int):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.tick = tick
+        self.received = 0
+        self.written = 0
+        self.conflicts = 0
+        self._pending: dict[tuple[str, str], PendingSave] = {}  # (user_id, entry_id) -> latest save
+        self._writing: dict[tuple[str, str], PendingSave] = {}  # saves whose write is in flight
+        # (user_id, entry_id) -> text of a buffered save that lost at flush, until the client is told
+        self._conflicted = TTLCache(maxsize=max_conflicts, ttl=conflict_ttl)
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    async def save(self, entry_id: str, user_id: str, content: str, version: int, flush: bool = False) -> int:
+        """
+        Buffer content for entry_id as the successor of `version` and return the new version.
+        Raises JournalVersionConflict when `version` is not the entry's latest one (or an earlier
+        buffered save of this user's lost a race), JournalEntryNotFound when the entry isn't the user's.
+        """
+        self.received += 1
+        key = (str(user_id), entry_id)
+        unsaved = self._conflicted.pop(key)
+        if unsaved is not None:
+            raise JournalVersionConflict(entry_id, unsaved_content=unsaved)
+        now = time.monotonic()
+        pending = self._pending.get(key) or self._writing.get(key)
+        if pending and key in self._pending:
+            if pending.version != version:
+                raise JournalVersionConflict(entry_id, pending.version)
+            pending.content, pending.version, pending.last_at = content, version + 1, now
+        elif pending:
+            # the previous save is being written right now; chain onto the version it will leave
+            if pending.version != version:
+                raise JournalVersionConflict(entry_id, pending.version)
+            pending = PendingSave(str(user_id), content, version, version + 1, now, now)
+            self._pending[key] = pending
+        else:
+            # first save of a window: one read checks ownership and that the client isn't already stale
+            current = await get_journal_entry_version(entry_id, user_id)
+            if current is None:
+                raise JournalEntryNotFound(entry_id)
+            if current != version or key in self._pending or key in self._writing:
+                # stale client, or another request of this user's got buffered while we were reading
+                raise JournalVersionConflict(entry_id, current)
+            pending = PendingSave(str(user_id), content, version, version + 1, now, now)
+            self._pending[key] = pending
+        if flush:
+            pending.last_at = now - self.debounce
+        return pending.version
+
+    def overlay(self, entry: dict | None, user_id: str) -> dict | None:
+        """Read-your-writes for GETs: a fetched row with this user's buffered content and version."""
+        if not entry:
+            return entry
+        key = (str(user_id), entry["id"])
+        pending = self._pending.get(key) or self._writing.get(key)
+        if pending:
+            entry = {
+                **entry,
+                "content": pending.content,
+                "word_count": len(pending.content.split()),
+                "preview": build_entry_preview(pending.content),
+                "version": pending.version,
+            }
+        return entry
+
+    def take_conflict(self, entry_id: str, user_id: str) -> str | None:
+        """Text of this user's buffered save that lost a version race, handed out once (on a read)."""
+        return self._conflicted.pop((str(user_id), entry_id))
+
+    def _due(self, now: float) -> dict[tuple[str, str], PendingSave]:
+        return {
+            key: pending for key, pending in self._pending.items()
+            if now - pending.last_at >= self.debounce or now - pending.first_at >= self.max_delay
+        }
+
+    async def flush(self, everything: bool = False):
+        async with self._flush_lock:
+            due = dict(self._pending) if everything else self._due(time.monotonic())
+            if not due:
+                return
+            for key in due:
+                del self._pending[key]
+            set_supabase_service_role(True)
+            try:
+                for key, pending in due.items():
+                    self._writing[key] = pending
+                    try:
+                        await self._write(key, pending)
+                    finally:
+                        self._writing.pop(key, None)
+            finally:
+                set_supabase_service_role(False)
+
+    async def _write(self, key: tuple[str, str], pending: PendingSave):
+        entry_id = key[1]
+        try:
+            updated = await update_journal_entry(
+                entry_id, pending.user_id, pending.content,
+                expected_version=pending.base_version, new_version=pending.version
+            )
+        except Exception as e:
+            logger.error(f"Writing buffered journal entry {entry_id} failed, retrying next tick: {e}")
+            newer = self._pending.get(key)
+            if newer:
+                # later saves carry the full content; keep the version the database actually has
+                newer.base_version, newer.first_at = pending.base_version, pending.first_at
+            else:
+                self._pending[key] = pending
+            return
+        if updated:
+            self.written += 1
+            return
+        # version moved on under us (another process, tab or a WhatsApp append): the client was told
+        # this text was saved, so keep it and hand it back on its next save or read
+        self.conflicts += 1
+        newer = self._pending.pop(key, None)
+        self._conflicted.set(key, (newer or pending).content)
+        logger.warning(f"Buffered save for journal entry {entry_id} lost a version race (base {pending.base_version})")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            await self.flush()
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush(everything=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "received": self.received,
+            "written": self.written,
+            "conflicts": self.conflicts,
+            "coalescing_ratio": round(self.received / self.written, 2) if self.written else 0.0,
+        }
+
+
+autosave_buffer = JournalAutosaveBuffer(
+    debounce=config.journal_autosave.debounce,
+    max_delay=config.journal_autosave.max_delay,
+    tick=config.journal_autosave.tick,
+    conflict_ttl=config.journal_autosave.conflict_ttl,
+    max_conflicts=config.journal_autosave.max_conflicts,
+)
@@ -1,49 +1,143 @@
 from datetime import datetime, timedelta
 import pytz
 import logging
+from app.config import config
 from app.config.auth_config import supabase_client as supabase
+from app.db.base import execute
+from app.utils.cache import TTLCache
 from app.utils.common_utils import validate_data_presence
 
 logger = logging.getLogger(__name__)
 
-async def get_or_create_today_entry(user_id: str, local_date: str):
-    today_str = local_date
-    # try to fetch
-    res = supabase.table("journal_entries").select("*").eq("user_id", user_id).eq("entry_date", today_str).limit(1).execute()
+# (user_id, local_date) -> journal entry id, shared by the web views and the WhatsApp path.
+# Each entry expires at the user's local midnight, when "today" moves on anyway.
+today_entry_cache = TTLCache(maxsize=config.app.user_cache_size, ttl=24 * 3600)
+
+
+# user_id -> number of journal entries, for the archive's page count. Counted once, then dropped
+# whenever this process creates an entry; the TTL covers entries created by other processes.
+archive_count_cache = TTLCache(maxsize=config.app.user_cache_size, ttl=300)
+
+
+def forget_archive_count(user_id: str):
+    archive_count_cache.pop(str(user_id))
+
+
+def _seconds_until_local_midnight(local_now: datetime) -> float:
+    next_midnight = (local_now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(1.0, (next_midnight - local_now).total_seconds())
+
 
-    # The code here does not need a create command: if there is no data, it will create it.
+def cache_today_entry_id(user_id: str, local_date: str, entry_id: str, local_now: datetime = None):
+    ttl = _seconds_until_local_midnight(local_now) if local_now else None
+    today_entry_cache.set((str(user_id), local_date), entry_id, ttl=ttl)
+
+
+def find_today_entry_id(user_id: str, local_date: str, local_now: datetime = None):
+    """Id of the user's entry for local_date if it exists (lookup only, never creates)."""
+    entry_id = today_entry_cache.get((str(user_id), local_date))
+    if entry_id:
+        return entry_id
+    res = supabase.table("journal_entries").select("id").eq("user_id", user_id).eq("entry_date", local_date).limit(1).execute()
     if validate_data_presence(res):
-        return res.data[0]
-    else:
-        # create it
-        insert = supabase.table("journal_entries").insert({
-            "user_id": user_id,
-            "entry_date": today_str,
-            "content": "",
-            "word_count": 0
-        }).execute()
-        return insert.data[0]
-
-
-async def update_journal_entry(entry_id: str, user_id: str, content: str) -> bool:
-    update = supabase.table("journal_entries") \
+        entry_id = res.data[0]["id"]
+        cache_today_entry_id(user_id, local_date, entry_id, local_now)
+        return entry_id
+    return None
+
+
+async def get_today_entry_id(user_id: str, local_date: str, local_now: datetime = None):
+    """
+    Id of the user's entry for local_date, created if needed. `ensure_journal_entry(p_user_id, p_entry_date)`
+    is INSERT (user_id, entry_date, content, word_count, preview, version) VALUES (p_user_id, p_entry_date, '', 0, '', 0)
+    ON CONFLICT (user_id, entry_date) DO UPDATE SET user_id = excluded.user_id RETURNING id,
+    so concurrent messages get the same row and no content travels over the wire.
+    """
+    entry_id = today_entry_cache.get((str(user_id), local_date))
+    if entry_id:
+        return entry_id
+    res = supabase.rpc("ensure_journal_entry", {"p_user_id": user_id, "p_entry_date": local_date}).execute()
+    entry_id = res.data
+    if entry_id:
+        cache_today_entry_id(user_id, local_date, entry_id, local_now)
+        forget_archive_count(user_id)  # may have created the entry
+    return entry_id
+
+
+async def get_or_create_today_entry(user_id: str, local_date: str):
+    """
+    Full row for local_date in one statement. `ensure_journal_entry_row(p_user_id, p_entry_date)` is the
+    same INSERT ... ON CONFLICT as ensure_journal_entry (a new entry gets content '', word_count 0,
+    preview '', version 0 from the statement, not from column defaults; an existing one is left alone)
+    but RETURNING the whole row.
+    """
+    known = today_entry_cache.get((str(user_id), local_date))
+    res = supabase.rpc("ensure_journal_entry_row", {"p_user_id": user_id, "p_entry_date": local_date}).execute()
+    entry = res.data[0] if isinstance(res.data, list) else res.data
+    cache_today_entry_id(user_id, local_date, entry["id"])
+    if not known:
+        forget_archive_count(user_id)  # may have created the entry
+    return entry
+
+
+PREVIEW_CHARS = 120
+
+
+def build_entry_preview(content: str) -> str:
+    """Stored in journal_entries.preview so list views never need the full content."""
+    return (content or "")[:PREVIEW_CHARS].split("\n")[0].strip()
+
+
+async def update_journal_entry(entry_id: str, user_id: str, content: str, expected_version: int, new_version: int) -> bool:
+    """
+    Compare-and-set on journal_entries.version: False (nothing written) when the row is missing,
+    not the user's, or no longer at expected_version.
+    """
+    update = await execute(supabase.table("journal_entries") \
         .update({
             "content": content,
-            "word_count": len(content.split())
+            "word_count": len(content.split()),
+            "preview": build_entry_preview(content),
+            "version": new_version
         }) \
         .eq("id", entry_id) \
         .eq("user_id", user_id) \
-        .execute()
+        .eq("version", expected_version))
 
-    return True
+    return bool(update.data)
 
-async def append_journal_entry(user_id:str, entry:dict, content:str) -> bool:
+async def append_journal_entry(user_id:str, entry:dict, content:str):
+    """
+    Appends server-side and returns the entry id (None on failure); only entry['id'] is used.
+    `append_journal_entry(p_entry_id, p_user_id, p_content, p_word_delta)` runs
+    UPDATE journal_entries SET content = content || E'\\n' || p_content, word_count = word_count + p_word_delta,
+    version = version + 1
+    WHERE id = p_entry_id AND user_id = p_user_id RETURNING id, so concurrent appends don't overwrite each other.
+    While the old content is shorter than PREVIEW_CHARS it also refreshes `preview` the way
+    build_entry_preview does (btrim(split_part(left(content, 120), E'\\n', 1))); longer entries keep theirs.
+    """
     if not entry:
         logger.error(f"No entry found for user {user_id}. Cannot append content.")
-        return False
+        return None
 
-    new_content = f"{entry['content']}\n{content}"
-    return await update_journal_entry(entry_id=entry['id'], user_id=user_id, content=new_content)
+    res = supabase.rpc("append_journal_entry", {
+        "p_entry_id": entry['id'],
+        "p_user_id": user_id,
+        "p_content": content,
+        "p_word_delta": len(content.split())
+    }).execute()
+    return res.data
+
+async def get_journal_entry_version(entry_id: str, user_id: str) -> int | None:
+    """Current journal_entries.version, or None when the entry doesn't exist or isn't the user's."""
+    res = await execute(supabase.table("journal_entries") \
+        .select("version") \
+        .eq("id", entry_id) \
+        .eq("user_id", user_id) \
+        .limit(1))
+    if validate_data_presence(res):
+        return res.data[0]["version"]
+    return None
 
 async def get_journal_entry_by_id(entry_id: str, user_id: str):
     res = supabase.table("journal_entries") \
@@ -62,12 +156,18 @@ async def log_entry_from_whatsapp(user_id:str, tz_offset:int, content:str, sourc
     local_date = local_now.strftime("%Y-%m-%d")
 
     try:
-        today_entry = await get_or_create_today_entry(user_id=user_id, local_date=local_date)
-
-        await append_journal_entry(user_id=user_id, entry=today_entry, content=content)
+        entry_id = await get_today_entry_id(user_id=user_id, local_date=local_date, local_now=local_now)
+        appended_id = await append_journal_entry(user_id=user_id, entry={"id": entry_id}, content=content)
+        if not appended_id:
+            # cached id may point at an entry deleted since; resolve it again once
+            today_entry_cache.pop((str(user_id), local_date))
+            entry_id = await get_today_entry_id(user_id=user_id, local_date=local_date, local_now=local_now)
+            appended_id = await append_journal_entry(user_id=user_id, entry={"id": entry_id}, content=content)
+        if not appended_id:
+            logger.error(f"Appending to entry {entry_id} for user {user_id} updated nothing")
+            return False, None
 
-        return True, today_entry['id']
+        return True, appended_id
     except Exception as e:
         logger.error(f"Error logging entry from WhatsApp for user {user_id}: {e}")
         return False, None
-
@@ -0,0 +1,108 @@
+# report_engine.py
+# Report chapters form a small DAG: most only need the user's answers, a few build on an earlier
+# chapter's text. Run every chapter as soon as its inputs exist, so a report takes about as long as
+# its longest chain of chapters instead of one model call per free worker slot.
+import asyncio, logging
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# chapter title -> titles of the chapters whose text its prompt includes (see report_filer.py)
+CHAPTER_DEPENDENCIES = {
+    "Recommendations On How To Implement More Meaning": ["Potential Sources of Meaning"],
+    "Reflective Questions": ["Summary"],
+    "Resource List": ["Barriers"],
+}
+
+
+@dataclass
+class ChapterResult:
+    content: str
+    usage: dict = field(default_factory=dict)  # prompt_tokens, cached_tokens, completion_tokens
+
+
+@dataclass
+class ChapterJob:
+    chapter_id: str
+    chapter_prompt_id: str
+    order_index: int
+    title: str
+    prompt: str
+    depends_on: list[str] = field(default_factory=list)
+
+
+def build_chapter_jobs(chapters: list[dict]) -> list[ChapterJob]:
+    """
+    ChapterJobs for rows shaped {"chapter_id", "chapter_prompt_id", "order_index", "title", "prompt"}.
+    Dependencies on chapters this report type doesn't have are dropped; a cycle raises ValueError.
+    """
+    titles = {chapter["title"] for chapter in chapters}
+    jobs = []
+    for chapter in chapters:
+        wanted = CHAPTER_DEPENDENCIES.get(chapter["title"], [])
+        missing = [title for title in wanted if title not in titles]
+        if missing:
+            logger.warning(f"Chapter '{chapter['title']}' depends on missing chapters {missing}, generating without them")
+        jobs.append(ChapterJob(
+            chapter_id=chapter["chapter_id"],
+            chapter_prompt_id=chapter["chapter_prompt_id"],
+            order_index=chapter["order_index"],
+            title=chapter["title"],
+            prompt=chapter["prompt"],
+            depends_on=[title for title in wanted if title in titles],
+        ))
+    _check_acyclic(jobs)
+    return jobs
+
+
+def _check_acyclic(jobs: list[ChapterJob]):
+    graph = {job.title: job.depends_on for job in jobs}
+    done, visiting = set(), set()
+
+    def visit(title: str):
+        if title in done:
+            return
+        if title in visiting:
+            raise ValueError(f"Chapter dependencies form a cycle through '{title}'")
+        visiting.add(title)
+        for dependency in graph[title]:
+            visit(dependency)
+        visiting.discard(title)
+        done.add(title)
+
+    for title in graph:
+        visit(title)
+
+
+async def run_chapter_graph(
+    jobs: list[ChapterJob],
+    generate: Callable[[ChapterJob, dict[str, str]], Awaitable[ChapterResult]],
+    on_chapter_done: Callable[[ChapterJob, ChapterResult], Awaitable[None]],
+    max_concurrency: int,
+) -> dict[str, str]:
+    """
+    Run generate(job, {dependency title: text}) for every job once its dependencies have finished,
+    at most max_concurrency at a time, and hand each result to on_chapter_done.
+    A failed chapter is logged and skips the chapters that need it; the others still run.
+    Returns {title: text} for the chapters that finished.
+    """
+    slots = asyncio.Semaphore(max_concurrency)
+    results: dict[str, asyncio.Future] = {job.title: asyncio.get_running_loop().create_future() for job in jobs}
+
+    async def run(job: ChapterJob):
+        try:
+            inputs = {title: await results[title] for title in job.depends_on}
+            async with slots:
+                result = await generate(job, inputs)
+            await on_chapter_done(job, result)
+            results[job.title].set_result(result.content)
+        except Exception as e:
+            logger.error(f"Chapter '{job.title}' failed: {e}")
+            results[job.title].set_exception(e)
+
+    await asyncio.gather(*(run(job) for job in jobs))
+    return {
+        title: future.result() for title, future in results.items()
+        if not future.exception()
+    }
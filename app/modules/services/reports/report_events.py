@@ -0,0 +1,116 @@
+# report_events.py
+# Chapter progress pushed instead of polled: the Celery task publishes each progress change on a
+# Redis channel per report, and every web process keeps one pattern subscription that fans the
+# events out to the SSE streams watching that report. Idle watchers cost no database queries.
+import asyncio, json, logging
+from contextlib import asynccontextmanager
+import redis
+import redis.asyncio as aioredis
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+_publisher: redis.Redis | None = None
+
+
+def _channel(report_id: str) -> str:
+    return f"{config.reports.events_channel_prefix}{report_id}"
+
+
+def publish_report_event(report_id: str, event: dict):
+    """Called from the worker after each progress change. Best effort: progress is in the DB anyway."""
+    global _publisher
+    try:
+        if _publisher is None:
+            _publisher = redis.Redis.from_url(config.reports.events_redis_url)
+        _publisher.publish(_channel(report_id), json.dumps({"report_id": report_id, **event}))
+    except redis.RedisError as e:
+        logger.error(f"Publishing progress for report {report_id} failed: {e}")
+
+
+class ReportEventHub:
+    def __init__(self, redis_url: str, channel_prefix: str, queue_size: int):
+        self.redis_url = redis_url
+        self.channel_prefix = channel_prefix
+        self.queue_size = queue_size
+        self.dropped = 0
+        self._watchers: dict[str, set[asyncio.Queue]] = {}
+        self._task: asyncio.Task | None = None
+
+    @asynccontextmanager
+    async def watch(self, report_id: str):
+        """Queue of progress events for report_id for as long as the block runs."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._watchers.setdefault(str(report_id), set()).add(queue)
+        try:
+            yield queue
+        finally:
+            watchers = self._watchers.get(str(report_id), set())
+            watchers.discard(queue)
+            if not watchers:
+                self._watchers.pop(str(report_id), None)
+
+    def _dispatch(self, channel: str, data: bytes):
+        report_id = channel[len(self.channel_prefix):]
+        watchers = self._watchers.get(report_id)
+        if not watchers:
+            return
+        try:
+            event = json.loads(data)
+        except ValueError:
+            logger.error(f"Malformed report event on {channel}: {data!r}")
+            return
+        for queue in watchers:
+            if queue.full():
+                self._coalesce(queue)
+            queue.put_nowait(event)
+
+    def _coalesce(self, queue: asyncio.Queue):
+        """
+        Make room in a slow client's queue: drop its streamed chapter deltas first (the chapter's "done"
+        event carries the full text), and only when there are none its oldest event.
+        """
+        events = [queue.get_nowait() for _ in range(queue.qsize())]
+        kept = [event for event in events if not (event.get("type") == "chapter" and "delta" in event)]
+        if len(kept) == len(events):
+            kept.pop(0)
+        self.dropped += len(events) - len(kept)
+        for event in kept:
+            queue.put_nowait(event)
+
+    async def _listen(self):
+        delay = 1
+        while True:
+            client = aioredis.Redis.from_url(self.redis_url)
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{self.channel_prefix}*")
+                delay = 1
+                async for message in pubsub.listen():
+                    if message["type"] == "pmessage":
+                        self._dispatch(message["channel"].decode(), message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Report event subscription lost, reconnecting in {delay}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+            finally:
+                await pubsub.aclose()
+                await client.aclose()
+
+    async def start(self):
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+report_event_hub = ReportEventHub(
+    redis_url=config.reports.events_redis_url,
+    channel_prefix=config.reports.events_channel_prefix,
+    queue_size=config.reports.watcher_queue_size,
+)
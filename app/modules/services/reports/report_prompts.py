@@ -0,0 +1,28 @@
+# report_prompts.py
+# Every chapter of a report is written from the same (long) block of user answers. Send that block
+# first and byte-identical for each chapter, and the chapter instructions after it, so the provider's
+# prompt cache can reuse the shared prefix for every chapter after the first.
+from app.modules.services.reports.report_engine import ChapterJob
+
+ANSWERS_PLACEHOLDER = "{{answers}}"
+ANSWERS_HEADER = "The user's answers to the report questions. Every chapter of the report is based on them.\n\n"
+
+
+def build_answers_context(user_answers: list[dict]) -> str:
+    """The shared prefix, built once per report and stored on reports.answers_context."""
+    answers_text = "\n".join(
+        [f"{a['question']}: {a['answer']}" for a in user_answers]
+    )
+    return ANSWERS_HEADER + answers_text
+
+
+def build_chapter_messages(answers_context: str, job: ChapterJob, inputs: dict[str, str]) -> list[dict]:
+    # the answers live in the shared system message; older prompt versions still carry the placeholder
+    instructions = job.prompt.replace(ANSWERS_PLACEHOLDER, "(the user's answers above)")
+    # chapters that build on earlier ones get that text appended ("chapter included below")
+    for title, content in inputs.items():
+        instructions += f"\n\n{title} chapter:\n{content}"
+    return [
+        {"role": "system", "content": answers_context},
+        {"role": "user", "content": instructions},
+    ]
@@ -3,6 +3,7 @@ from app.config.auth_config import supabase_client as supabase
 from app.modules.services.auth.auth_utils import AuthenticationUtils
 from app.modules.services.users.user_services import create_whatsapp_link_token
 from app.utils.common_utils import validate_data_presence
+from app.utils.cache import invalidate_user_profile
 from datetime import datetime
 
 router = APIRouter()
@@ -50,6 +51,7 @@ async def update_profile(data: dict, current_user=Depends(AuthenticationUtils.ge
     }
 
     res = supabase.table("user_settings").update(updates).eq("user_id", user_id).execute()
+    invalidate_user_profile(user_id=user_id, sub=current_user.get("sub"))
 
     if not res.data:
         raise HTTPException(status_code=400, detail="Failed to update profile")
@@ -79,6 +81,7 @@ async def update_preferences(data: dict, current_user=Depends(AuthenticationUtil
 
 
     res = supabase.table("user_settings").update(updates).eq("user_id", user_id).execute()
+    invalidate_user_profile(user_id=user_id, sub=current_user.get("sub"))
 
     if not res.data:
         raise HTTPException(status_code=400, detail="Failed to update preferences")
@@ -6,6 +6,7 @@ from app.config.auth_config import (
     set_supabase_service_role,
 )
 from app.utils.common_utils import validate_data_presence
+from app.utils.cache import invalidate_user_profile
 from app.db.db_operations.subscriptions import get_consumption, update_consumption_data, update_sub_data
 from app.db.db_operations.whatsapp_accounts import link_wa_to_user
 from app.db.db_operations.user_settings import update_user_settings
@@ -82,6 +83,7 @@ async def create_user(sub: UUID, email: str, name: str = "") -> dict:
 async def delete_user(user_id: UUID) -> None:
     try:
         supabase.table("users").update({"deleted": True}).eq("id", user_id).execute()
+        invalidate_user_profile(user_id=user_id)
     except Exception as e:
         logger.error(f"Error deleting user {user_id}: {e}")
         raise
@@ -90,6 +92,7 @@ async def delete_user(user_id: UUID) -> None:
 async def update_user(user_id: UUID, data: dict) -> dict:
     try:
         response = supabase.table("users").update(data).eq("id", user_id).execute()
+        invalidate_user_profile(user_id=user_id)
         return response.data[0] if response.data else {}
     except Exception as e:
         logger.error(f"Error updating user {user_id}: {e}")
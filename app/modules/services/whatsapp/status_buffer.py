@@ -0,0 +1,107 @@
+# status_buffer.py
+# Meta sends sent/delivered/read (or failed) for every outbound message; collapse them per wamid
+# and write each window as a single bulk upsert instead of a SELECT + UPDATE/INSERT per event.
+# The inbound queue jobs the statuses came from are only acked once their batch is written.
+import asyncio, logging
+from typing import Callable
+from app.config import config
+from app.config.auth_config import set_supabase_service_role
+from app.db.db_operations.messages import upsert_msg_statuses
+
+logger = logging.getLogger(__name__)
+
+# Statuses only move forward; a late "delivered" must not overwrite "read". "failed" always wins.
+STATUS_RANK = {"sent": 1, "delivered": 2, "read": 3, "failed": 4}
+
+
+class StatusUpdateBuffer:
+    def __init__(self, flush_interval: float, max_batch: int):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.received = 0
+        self.written = 0
+        self.flushes = 0
+        self._pending: dict[str, str] = {}
+        self._acks: dict[str, list[Callable[[], None]]] = {}  # wamid -> acks of the queue jobs behind it
+        self._flush_lock = asyncio.Lock()
+        self._full: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def _merge(self, wamid: str, status: str):
+        current = self._pending.get(wamid)
+        if current is None or STATUS_RANK.get(status, 0) >= STATUS_RANK.get(current, 0):
+            self._pending[wamid] = status
+
+    def add(self, wamid: str, status: str, ack: Callable[[], None] = None):
+        """Buffer a status; `ack` is called once it is in the database (a lower-ranked status counts too)."""
+        self.received += 1
+        self._merge(wamid, status)
+        if ack:
+            self._acks.setdefault(wamid, []).append(ack)
+        if len(self._pending) >= self.max_batch and self._full:
+            self._full.set()
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            acks, self._acks = self._acks, {}
+            rows = [{"wamid": wamid, "status": status} for wamid, status in batch.items()]
+            set_supabase_service_role(True)
+            try:
+                await upsert_msg_statuses(rows)
+                self.written += len(rows)
+                self.flushes += 1
+            except Exception as e:
+                logger.error(f"Flushing {len(rows)} WhatsApp statuses failed, keeping them for the next window: {e}")
+                for wamid, status in batch.items():
+                    self._merge(wamid, status)
+                for wamid, callbacks in acks.items():
+                    self._acks.setdefault(wamid, []).extend(callbacks)
+                return
+            finally:
+                set_supabase_service_role(False)
+            for callbacks in acks.values():
+                for ack in callbacks:
+                    try:
+                        ack()
+                    except Exception as e:
+                        # the job stays queued and is replayed after a restart; the upsert is idempotent
+                        logger.error(f"Acking a WhatsApp status job failed: {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+    async def start(self):
+        self._full = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "awaiting_ack": sum(len(callbacks) for callbacks in self._acks.values()),
+            "received": self.received,
+            "written": self.written,
+            "flushes": self.flushes,
+            "coalescing_ratio": round(self.received / self.written, 2) if self.written else 0.0,
+        }
+
+
+status_buffer = StatusUpdateBuffer(
+    flush_interval=config.wastatus.flush_interval,
+    max_batch=config.wastatus.max_batch,
+)
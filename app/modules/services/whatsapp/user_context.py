@@ -0,0 +1,168 @@
+# user_context.py
+# Everything one inbound WhatsApp message reads and writes about its sender: loaded with one RPC,
+# mutated in memory while the message is processed, written back with one RPC at the end.
+import logging, pytz
+from postgrest.exceptions import APIError
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from app.db.db_operations.messages import build_message_payload, insert_message, update_msg_status
+from app.db.db_operations.subscriptions import update_consumption_data
+from app.db.db_operations.user_context import get_wa_user_context, commit_wa_user_context
+from app.modules.services.users.user_services import update_consumption
+from app.modules.services.journal.journal_services import log_entry_from_whatsapp, cache_today_entry_id, forget_archive_count
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class UserMessageContext:
+    phone_number: str
+    user_data: dict  # same shape as get_user_from_number()
+    today_entry_id: str | None = None
+    usage_delta: float = 0.0
+    message_count_delta: int = 0
+    reset_message_count: bool = False
+    last_reset: str | None = None
+    journal_appends: list = field(default_factory=list)
+    inbound: dict | None = None  # the message being processed, stored by the commit
+    messages: list = field(default_factory=list)
+
+    @property
+    def user_id(self) -> str:
+        return self.user_data["user_id"]
+
+    @property
+    def subscription(self) -> dict:
+        subscriptions = self.user_data.get("users", {}).get("subscriptions") or [{}]
+        return subscriptions[0]
+
+    @property
+    def local_now(self) -> datetime:
+        # tz_offset is in minutes, same convention as log_entry_from_whatsapp
+        tz_offset = self.user_data["users"]["user_settings"]["tz_offset"]
+        return datetime.now(pytz.timezone('utc')) + timedelta(minutes=tz_offset)
+
+    @property
+    def local_date(self) -> str:
+        return self.local_now.strftime("%Y-%m-%d")
+
+    def check_and_reset_usage(self) -> bool:
+        """In-memory twin of user_services.check_and_reset_usage; the reset is written on commit."""
+        current_time = datetime.now(pytz.UTC)
+        last_reset_str = self.subscription.get("last_reset")
+        try:
+            last_reset = datetime.fromisoformat(last_reset_str) if last_reset_str else None
+        except ValueError as e:
+            logger.error(f"Error parsing last_reset: {e}")
+            last_reset = None
+        if last_reset is None:
+            self.last_reset = current_time.isoformat()
+            return False
+        if last_reset.tzinfo is None:
+            last_reset = last_reset.replace(tzinfo=pytz.UTC)
+        if current_time.year > last_reset.year or current_time.month > last_reset.month:
+            self.reset_message_count = True
+            self.last_reset = current_time.isoformat()
+            return True
+        return False
+
+    def add_consumption(self, duration: float, free: bool = False):
+        self.usage_delta += duration
+        if free and duration != 0.00:
+            self.message_count_delta += 1
+
+    def append_journal(self, content: str):
+        self.journal_appends.append(content)
+
+    def record_inbound(self, **message):
+        self.inbound = build_message_payload(user_id=self.user_id, **message)
+
+    def record_message(self, **message):
+        self.messages.append(build_message_payload(user_id=self.user_id, **message))
+
+    @property
+    def all_messages(self) -> list:
+        return ([self.inbound] if self.inbound else []) + self.messages
+
+    def commit_params(self, inbound_wamid: str = None) -> dict:
+        journal_content = "\n".join(self.journal_appends)
+        return {
+            "p_user_id": self.user_id,
+            "p_usage_delta": self.usage_delta,
+            "p_message_count_delta": self.message_count_delta,
+            "p_reset_message_count": self.reset_message_count,
+            "p_last_reset": self.last_reset,
+            "p_entry_date": self.local_date,
+            "p_journal_content": journal_content if self.journal_appends else None,
+            "p_word_delta": len(journal_content.split()),
+            "p_messages": self.all_messages,
+            "p_inbound_wamid": inbound_wamid,
+        }
+
+
+async def load_user_context(phone_number: str) -> UserMessageContext | None:
+    user_data = await get_wa_user_context(phone_number)
+    if not user_data:
+        return None
+    context = UserMessageContext(
+        phone_number=phone_number,
+        user_data=user_data,
+        today_entry_id=user_data.get("today_entry_id"),
+    )
+    if context.today_entry_id:
+        local_now = context.local_now
+        cache_today_entry_id(context.user_id, local_now.strftime("%Y-%m-%d"), context.today_entry_id, local_now)
+    return context
+
+
+async def commit_user_context(context: UserMessageContext, inbound_wamid: str = None) -> str | None:
+    """Single write-back of counters, journal text, messages and the inbound status; returns the entry id."""
+    params = context.commit_params(inbound_wamid=inbound_wamid)
+    for attempt in range(2):
+        try:
+            entry_id = await commit_wa_user_context(params)
+            break
+        except APIError as e:
+            # Postgres answered with an error, so the transaction rolled back: replay through the per-table calls
+            logger.error(f"commit_wa_user_context rejected for user {context.user_id}, replaying writes: {e}")
+            return await _replay_user_context(context, inbound_wamid)
+        except Exception as e:
+            # timeout or dropped connection: the commit may have landed. The RPC skips an inbound wamid it
+            # already committed, so resending it is safe; replaying per table would apply everything twice.
+            if attempt or not inbound_wamid:
+                logger.error(f"commit_wa_user_context failed for user {context.user_id}, writes may be lost: {e}")
+                return context.today_entry_id
+            logger.warning(f"commit_wa_user_context failed for user {context.user_id}, resending: {e}")
+    if entry_id:
+        if not context.today_entry_id:
+            forget_archive_count(context.user_id)  # the commit created today's entry
+        context.today_entry_id = entry_id
+        local_now = context.local_now
+        cache_today_entry_id(context.user_id, local_now.strftime("%Y-%m-%d"), entry_id, local_now)
+    return context.today_entry_id
+
+
+async def _replay_user_context(context: UserMessageContext, inbound_wamid: str = None) -> str | None:
+    if context.last_reset:
+        reset = {'last_reset': context.last_reset}
+        if context.reset_message_count:
+            reset['message_count'] = 0
+        await update_consumption_data(consumption_data=reset, user_id=context.user_id)
+    if context.usage_delta:
+        await update_consumption(duration=context.usage_delta, user_id=context.user_id, free=context.message_count_delta > 0)
+    entry_id = context.today_entry_id
+    if context.journal_appends:
+        _, entry_id = await log_entry_from_whatsapp(
+            user_id=context.user_id,
+            tz_offset=context.user_data['users']['user_settings']['tz_offset'],
+            content="\n".join(context.journal_appends)
+        )
+    for message in context.all_messages:
+        await insert_message(
+            user_id=context.user_id, message_id=message["wamid"], msg_content=message["message_content"],
+            incoming_tokens=message["tokens_used"], role=message["role"], status=message["status"],
+            msg_type=message["message_type"], media_id=message.get("media_id")
+        )
+    if inbound_wamid:
+        await update_msg_status(message_id=inbound_wamid, status="processed", entry_id=entry_id)
+    return entry_id
@@ -1,11 +1,16 @@
 #whatsapp.py
 import random, json, asyncio
-import aiohttp, logging
+import httpx, logging
 from app.config.general_config import WaVariables
+from app.core.http_clients import get_http_client, GRAPH_MESSAGES
 from app.utils.common_utils import get_wa_headers
 
 logger = logging.getLogger(__name__)
 
+# Failures where the request never reached Meta. Anything later (read/write errors, read timeouts)
+# may have been delivered already, so retrying those could send the user the same message twice.
+RETRYABLE_SEND_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
 
 # DEV CHANGED >> TEST ELABORATELY!!!
 
@@ -67,14 +72,13 @@ async def send_whatsapp_message(to_number: str, message: str, qr_buttons: list =
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(url, headers=headers, json=data) as response:
-                        if response.status == 200:
-                            return await response.json()
-                        else:
-                            logger.error(f"Failed to send message: response status = {response.status}, response = {response}")
-                            return None
-            except aiohttp.ClientConnectorError as e:
+                response = await get_http_client(GRAPH_MESSAGES).post(url, headers=headers, json=data)
+                if response.status_code == 200:
+                    return response.json()
+                else:
+                    logger.error(f"Failed to send message: response status = {response.status_code}, response = {response.text}")
+                    return None
+            except RETRYABLE_SEND_ERRORS as e:
                 logger.error(f"Connection Error on attempt {attempt + 1}: {str(e)}")
                 if attempt < max_retries - 1:
                     backoff_time = 2 ** attempt
@@ -132,24 +136,23 @@ async def send_template_message(to_number: str, template_name: str, link_vars=[]
     }
     logger.info(f"sending this package to facebook: {data}")
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=data) as response:
-                if response.status == 200:
-                    # logger.info(f"Status: {response.status}")
-                    # logger.info(f"Content-type: {response.headers['content-type']}")
-                    # logger.info(f"Content: {response}")
-                    response_data = await response.json()
-
-                    # Extract message_id from the response structure
-                    message_id = response_data['messages'][0]['id'] if response_data.get('messages') else None
-                    logger.info(f"message_id of template {template_name_new}: {message_id}")
-
-                    # Return both the message_id and the template_name_new
-                    return {"message_id": message_id, "template_name": template_name_new}
-                else:
-                    logger.error(f"Failed to send template message: {template_name_new} response status = {response.status}, response = {response}")
-                    return None
-    except aiohttp.ClientConnectorError as e:
+        response = await get_http_client(GRAPH_MESSAGES).post(url, headers=headers, json=data)
+        if response.status_code == 200:
+            # logger.info(f"Status: {response.status_code}")
+            # logger.info(f"Content-type: {response.headers['content-type']}")
+            # logger.info(f"Content: {response}")
+            response_data = response.json()
+
+            # Extract message_id from the response structure
+            message_id = response_data['messages'][0]['id'] if response_data.get('messages') else None
+            logger.info(f"message_id of template {template_name_new}: {message_id}")
+
+            # Return both the message_id and the template_name_new
+            return {"message_id": message_id, "template_name": template_name_new}
+        else:
+            logger.error(f"Failed to send template message: {template_name_new} response status = {response.status_code}, response = {response.text}")
+            return None
+    except httpx.TransportError as e:
         logger.error(f'Connection Error {str(e)}')
 
 
@@ -0,0 +1,179 @@
+# whatsapp_queue.py
+# Durable inbound queue: the webhook only persists work here, a worker pool drains it.
+import asyncio, json, logging, os, sqlite3, threading, time, zlib
+from functools import partial
+from app.config import config
+from .whatsapp_services import handle_new_message
+from .whatsapp_utils import handle_status_update
+
+logger = logging.getLogger(__name__)
+
+JOB_HANDLERS = {
+    "message": lambda payload: handle_new_message(message_data=payload),
+    "status": handle_status_update,
+}
+# handlers that take an `ack` callback and call it once their work is durable (statuses are written in batches)
+DEFERRED_ACK = {"status"}
+
+
+def split_webhook_payload(data: dict):
+    """Yield (kind, sender, payload) for every message and status in a (possibly batched) Meta delivery."""
+    for entry in data.get("entry", []):
+        for change in entry.get("changes", []):
+            value = change.get("value", {})
+            for message in value.get("messages", []):
+                yield "message", message.get("from", ""), message
+            for status in value.get("statuses", []):
+                yield "status", status.get("recipient_id", ""), status
+
+
+class InboundMessageQueue:
+    def __init__(self, db_path: str, workers: int, shard_queue_size: int, claim_batch: int,
+                 max_attempts: int, poll_interval: float):
+        self.db_path = db_path
+        self.workers = max(1, workers)
+        self.shard_queue_size = shard_queue_size
+        self.claim_batch = claim_batch
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._wakeup: asyncio.Event | None = None
+        self._shards: list[asyncio.Queue] = []
+        self._tasks: list[asyncio.Task] = []
+
+    # --- storage ---
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS inbound_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    sender TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS inbound_jobs_status_id ON inbound_jobs (status, id)")
+            self._conn = conn
+        return self._conn
+
+    def enqueue_webhook(self, data: dict) -> int:
+        """Persist every message/status of a webhook delivery; returns how many jobs were queued."""
+        now = time.time()
+        rows = [(kind, sender, json.dumps(payload), now) for kind, sender, payload in split_webhook_payload(data)]
+        if not rows:
+            return 0
+        with self._lock:
+            conn = self._db()
+            conn.execute("BEGIN")
+            conn.executemany("INSERT INTO inbound_jobs (kind, sender, payload, created_at) VALUES (?, ?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        if self._wakeup:
+            self._wakeup.set()
+        return len(rows)
+
+    def _claim(self) -> list[tuple]:
+        with self._lock:
+            conn = self._db()
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, kind, sender, payload, attempts FROM inbound_jobs WHERE status = 'pending' ORDER BY id LIMIT ?",
+                (self.claim_batch,)
+            ).fetchall()
+            if rows:
+                conn.executemany("UPDATE inbound_jobs SET status = 'in_flight' WHERE id = ?", [(r[0],) for r in rows])
+            conn.execute("COMMIT")
+        return rows
+
+    def _ack(self, job_id: int):
+        with self._lock:
+            self._db().execute("DELETE FROM inbound_jobs WHERE id = ?", (job_id,))
+
+    def _nack(self, job_id: int, attempts: int):
+        status = "failed" if attempts >= self.max_attempts else "pending"
+        with self._lock:
+            self._db().execute("UPDATE inbound_jobs SET status = ?, attempts = ? WHERE id = ?", (status, attempts, job_id))
+
+    def _recover(self) -> int:
+        """Jobs left in flight by a previous process (crash, deploy) are picked up again."""
+        with self._lock:
+            return self._db().execute("UPDATE inbound_jobs SET status = 'pending' WHERE status = 'in_flight'").rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._db().execute("SELECT status, COUNT(*) FROM inbound_jobs GROUP BY status").fetchall())
+        return {
+            "pending": counts.get("pending", 0),
+            "in_flight": counts.get("in_flight", 0),
+            "failed": counts.get("failed", 0),
+            "shard_depths": [q.qsize() for q in self._shards],
+        }
+
+    # --- workers ---
+    def _shard_for(self, sender: str) -> asyncio.Queue:
+        # Same sender -> same shard -> processed in arrival order
+        return self._shards[zlib.crc32(sender.encode()) % len(self._shards)]
+
+    async def _dispatch(self):
+        while True:
+            rows = self._claim()
+            if not rows:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            for row in rows:
+                # put() blocks while the shard is full, which stops further claims (backpressure)
+                await self._shard_for(row[2]).put(row)
+
+    async def _work(self, shard: asyncio.Queue):
+        while True:
+            job_id, kind, sender, payload, attempts = await shard.get()
+            try:
+                if kind in DEFERRED_ACK:
+                    await JOB_HANDLERS[kind](json.loads(payload), ack=partial(self._ack, job_id))
+                else:
+                    await JOB_HANDLERS[kind](json.loads(payload))
+                    self._ack(job_id)
+            except Exception as e:
+                logger.error(f"Inbound {kind} job {job_id} from {sender} failed (attempt {attempts + 1}): {e}")
+                self._nack(job_id, attempts + 1)
+            finally:
+                shard.task_done()
+
+    async def start(self):
+        recovered = self._recover()
+        if recovered:
+            logger.info(f"Re-queued {recovered} inbound WhatsApp jobs left in flight")
+        self._wakeup = asyncio.Event()
+        self._shards = [asyncio.Queue(maxsize=self.shard_queue_size) for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._dispatch())]
+        self._tasks += [asyncio.create_task(self._work(shard)) for shard in self._shards]
+        logger.info(f"Inbound WhatsApp queue started with {self.workers} workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # anything claimed but unfinished goes back to pending for the next start
+        self._recover()
+
+
+inbound_queue = InboundMessageQueue(
+    db_path=config.waqueue.db_path,
+    workers=config.waqueue.workers,
+    shard_queue_size=config.waqueue.shard_queue_size,
+    claim_batch=config.waqueue.claim_batch,
+    max_attempts=config.waqueue.max_attempts,
+    poll_interval=config.waqueue.poll_interval,
+)
@@ -2,15 +2,16 @@
 import logging
 from datetime import datetime
 from app.modules.services.ai.chatgpt_utils import transcribe_audio
+from app.modules.services.ai.chatgpt_messaging import stt_limit_response
 from app.modules.services.users.user_services import update_consumption, check_and_reset_usage
 from app.modules.services.journal.journal_services import log_entry_from_whatsapp
 from app.config.general_config import SubscriptionVariables
 from app.utils.messaging_utils import wa_text_msg_handler
 from app.db.db_operations.messages import update_msg_status, insert_message
-from app.db.db_operations.whatsapp_accounts import get_user_from_number
+from .user_context import load_user_context, commit_user_context
 from app.config.auth_config import set_supabase_service_role
-from .whatsapp_utils import is_old_msg, process_command, extract_message_details, cleanup_audio_files
-from .whatsapp_utils import link_new_phone_number
+from .whatsapp_utils import is_old_msg, process_command, extract_message_details
+from .whatsapp_utils import link_new_phone_number, audio_preflight
 
 logger = logging.getLogger(__name__)
 
@@ -19,8 +20,9 @@ logger = logging.getLogger(__name__)
 async def handle_new_message(message_data):
     logger.info(f"in handle new msg with: {message_data}")
     set_supabase_service_role(True)
+    context = None
     try:
-        message_id, from_num, content, message_type, timestamp, audio_id, mime_type, context_msg_id = await extract_message_details(message_data)
+        message_id, from_num, content, message_type, timestamp, audio_id, mime_type, context_msg_id, audio_sha256 = await extract_message_details(message_data)
         entry_id = None
         
         if await is_old_msg(message_id=message_id, timestamp=timestamp):
@@ -34,7 +36,9 @@ async def handle_new_message(message_data):
 
         # User data retrieval and handling
         logger.info(f"Retrieving user data with number: {from_num}")
-        user_data = await get_user_from_number(phone_number=from_num)
+        # one RPC for user, settings, subscription and today's entry; written back once in `finally`
+        context = await load_user_context(phone_number=from_num)
+        user_data = context.user_data if context else None
         logger.info(f"User data retrieved: {user_data}")
 
         if user_data and isinstance(user_data, dict):
@@ -47,7 +51,7 @@ async def handle_new_message(message_data):
                 msg_process_status, entry_id = await process_existing_user_message(
                     user_data=user_data, from_num=from_num, content=content, 
                     message_id=message_id, message_type=message_type, timestamp=timestamp, 
-                    audio_id=audio_id, mime_type=mime_type, context_msg_id=context_msg_id #, file_size=file_size
+                    audio_id=audio_id, mime_type=mime_type, context_msg_id=context_msg_id, audio_sha256=audio_sha256, context=context #, file_size=file_size
                 )
         else:
             try:
@@ -62,12 +66,16 @@ async def handle_new_message(message_data):
     finally:
         # Always update message status, regardless of previous errors
         status = "processed"
-        await update_msg_status(message_id=message_id, status=status, entry_id=entry_id)
+        if context:
+            # counters, journal text, replies and the processed status in one transaction
+            entry_id = await commit_user_context(context, inbound_wamid=message_id)
+        else:
+            await update_msg_status(message_id=message_id, status=status, entry_id=entry_id)
         set_supabase_service_role(False)
 
 
 # we essentially want to reply to the same source as that we got the msg from.
-async def process_existing_user_message(user_data: dict, from_num: str, content, message_id, message_type, timestamp, audio_id=None, mime_type=None, context_msg_id=None):
+async def process_existing_user_message(user_data: dict, from_num: str, content, message_id, message_type, timestamp, audio_id=None, mime_type=None, context_msg_id=None, audio_sha256=None, context=None):
     logger.info(f"we enter the loop with content: {content}")
     try:
         user_id = user_data['user_id']
@@ -94,19 +102,39 @@ async def process_existing_user_message(user_data: dict, from_num: str, content,
 
         # here we will add the if audio_id bla bla, to get to the content part. If media in, we choose for media out.
         if audio_id:
-            just_reset = await check_and_reset_usage(user_id) if free else False
+            if free:
+                just_reset = context.check_and_reset_usage() if context else await check_and_reset_usage(user_id)
+            else:
+                just_reset = False
 
             if user_data['users']['subscriptions'][0]['message_count'] >= SubscriptionVariables.free_message_count and free and not just_reset:
                 message = 'You\'ve reached the free limit for this month. If you want to upgrade and transcribe longer messages, upgrade your subscription in the Purpose Quest dashboard.'
-                await wa_text_msg_handler(user_id=user_id, msg=message, from_num=from_num)
+                await wa_text_msg_handler(user_id=user_id, msg=message, from_num=from_num, context=context)
                 return False, None
+
+            # Reject over-limit audio from metadata + ranged Ogg reads, before downloading or converting it
+            media_url = None
+            try:
+                preflight = await audio_preflight(media_id=audio_id, mime_type=mime_type)
+                media_url = preflight['media_url']
+                audio_sha256 = audio_sha256 or preflight['sha256']
+                limit_resp = stt_limit_response(preflight['duration'], free) if preflight['duration'] is not None else None
+                if limit_resp:
+                    await wa_text_msg_handler(user_id=user_id, msg=limit_resp['data'], from_num=from_num, context=context)
+                    return False, None
+            except Exception as e:
+                # perform_stt still enforces the limit after download
+                logger.warning(f"Audio preflight failed for {audio_id}, continuing without it: {e}")
             
             message = "Transcribing and processing message... ✍️"
-            await wa_text_msg_handler(user_id=user_id, msg=message, from_num=from_num)
+            await wa_text_msg_handler(user_id=user_id, msg=message, from_num=from_num, context=context)
 
             # gotta transcribe here.
             try:
-                transcribe_response = await transcribe_audio(audio_id=audio_id, message_id=message_id, mime_type=mime_type, user_data=user_data)
+                transcribe_response = await transcribe_audio(
+                    audio_id=audio_id, message_id=message_id, mime_type=mime_type, user_data=user_data,
+                    audio_sha256=audio_sha256, media_url=media_url
+                )
             except Exception as e:
                 logger.error(f"Error during audio transcription: {e}")
                 return 'error', None
@@ -123,10 +151,12 @@ async def process_existing_user_message(user_data: dict, from_num: str, content,
                 content = transcribe_response['data']
                 duration = transcribe_response['duration']
 
-            await update_consumption(duration=duration, user_id=user_id, free=free)
-            # this is the input of the user
-            content, ogg_in_file_path, mp3_in_file_path = transcribe_response['data'], transcribe_response['ogg_in_file_path'], transcribe_response['mp3_in_file_path']
-            await cleanup_audio_files(ogg_in_file_path=ogg_in_file_path, mp3_in_file_path=mp3_in_file_path)
+            if context:
+                context.add_consumption(duration=duration, free=free)
+            else:
+                await update_consumption(duration=duration, user_id=user_id, free=free)
+            # this is the input of the user (the audio files were already removed with their scratch dir)
+            content = transcribe_response.get('data', content)
 
         else:
             content_stripped = content.strip().lower()
@@ -142,6 +172,9 @@ async def process_existing_user_message(user_data: dict, from_num: str, content,
             # If the content is a list, send each chunk as a separate message
             for chunk in content:
                 # here we want to make sure the chunks are added to the users entry for today. Appended or inserted.
+                if context:
+                    context.append_journal(chunk)
+                    continue
                 status = await log_entry_from_whatsapp(user_id=user_id, tz_offset=user_data['users']['user_settings']['tz_offset'], content=chunk)
                 if not status:
                     logger.error(f"Failed to log entry for user {user_id} with content: {chunk}")
@@ -150,7 +183,11 @@ async def process_existing_user_message(user_data: dict, from_num: str, content,
 
         else:
             # If the content is not a list, we want to add the full content to the user entry for today.
-            status, entry_id = await log_entry_from_whatsapp(user_id=user_id, tz_offset=user_data['users']['user_settings']['tz_offset'], content=content)
+            if context:
+                context.append_journal(content)
+                status, entry_id = True, context.today_entry_id
+            else:
+                status, entry_id = await log_entry_from_whatsapp(user_id=user_id, tz_offset=user_data['users']['user_settings']['tz_offset'], content=content)
             if not status:
                 logger.error(f"Failed to log entry for user {user_id} with content: {content}")
                 error_occured = True
@@ -165,7 +202,8 @@ async def process_existing_user_message(user_data: dict, from_num: str, content,
         await wa_text_msg_handler(
             user_id=user_id, 
             msg=message_content, 
-            from_num=from_num
+            from_num=from_num,
+            context=context
         )
 
         return True, entry_id
@@ -176,4 +214,9 @@ async def process_existing_user_message(user_data: dict, from_num: str, content,
 
     finally:
         # Insert incoming message with updated or default values
-        await insert_message(user_id=user_id, message_id=message_id, msg_content=content, incoming_tokens = 0, role='user', status='received', msg_type=message_type, media_id=audio_id)
\ No newline at end of file
+        inbound = dict(message_id=message_id, msg_content=content, incoming_tokens = 0, role='user', status='received', msg_type=message_type, media_id=audio_id)
+        if context:
+            # stored by commit_user_context, in the same transaction as everything else
+            context.record_inbound(**inbound)
+        else:
+            await insert_message(user_id=user_id, **inbound)
\ No newline at end of file
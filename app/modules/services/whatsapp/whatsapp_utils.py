@@ -1,16 +1,19 @@
 # Define functions for each command
-import logging, httpx, os
-import pytz
+import base64, logging, os, tempfile
+import aiofiles, pytz
 from datetime import datetime, timedelta
 
 from app.modules.services.whatsapp.whatsapp_messaging import send_whatsapp_message
+from app.core.http_clients import get_http_client, GRAPH_MEDIA, CDN
+from app.config import config
+from app.modules.voice.audio_pipeline import ogg_duration_from_pages, OGG_HEAD_BYTES, OGG_TAIL_BYTES
 from app.config.general_config import WaVariables
 from app.utils.common_utils import async_exception_handler, get_wa_headers, get_wa_ul_headers
-from app.db.db_operations.messages import msg_is_processed, insert_msg_status, update_msg_status, get_context_msg
+from app.db.db_operations.messages import msg_is_processed, get_context_msg
 from app.db.db_operations.wa_link_tokens import get_user_id_from_token, update_token_validity
 from app.modules.services.users.user_services import link_wa_account_to_user
 from app.utils.messaging_utils import wa_text_msg_handler
-from app.config.auth_config import set_supabase_service_role
+from app.modules.services.whatsapp.status_buffer import status_buffer
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +21,7 @@ async def extract_message_details(message_data):
     logger.info(f"message_data: {message_data}")
     audio_id = None
     mime_type = None
+    audio_sha256 = None
     context_msg_id = None
     message_id = message_data['id']
     from_num = message_data['from']
@@ -45,9 +49,10 @@ async def extract_message_details(message_data):
         content = "audio file!"
         audio_id = message_data['audio']['id']
         mime_type = message_data['audio']['mime_type']
+        audio_sha256 = message_data['audio'].get('sha256')  # content hash, keys the transcription cache
         # file_size = message_data['audio']['file_size']
 
-    return message_id, from_num, content, message_type, timestamp, audio_id, mime_type, context_msg_id
+    return message_id, from_num, content, message_type, timestamp, audio_id, mime_type, context_msg_id, audio_sha256
 
 # DEV: make sure to change the faq and contact URLS!
 async def process_help_command():
@@ -112,27 +117,17 @@ async def is_processed(wamid):
 
     return processed
 
-async def handle_status_update(status_data):
+async def handle_status_update(status_data, ack=None):
     logger.info(f"status_data: {status_data}")
     status_id = status_data['id']
     status = status_data['status']
 
-    set_supabase_service_role(True)
-    try:
-        # current code checks if the message already exists, which it does, because it is a status update
-        # if it does not exist yet, it will be inserted. If it exists, it will update it.
-        if await is_processed(status_id):
-            await update_msg_status(message_id=status_id, status=status)
-        else:
-            await insert_msg_status(message_id=status_id, status=status)
-            logger.warning(f"inserting another empty message: {status_data}")
-    finally:
-        set_supabase_service_role(False)
+    # Coalesced per wamid and written in bulk (upsert on wamid) by the status buffer, which acks once written
+    status_buffer.add(status_id, status, ack=ack)
 
 async def get_media_url(media_id):
     headers = get_wa_headers()
-    async with httpx.AsyncClient() as client:
-        response = await client.get(WaVariables.wa_dl_url.format(media_id=media_id), headers=headers)
+    response = await get_http_client(GRAPH_MEDIA).get(WaVariables.wa_dl_url.format(media_id=media_id), headers=headers)
     response.raise_for_status()  # This will raise an exception for 4XX/5XX responses
 
     # Assuming the API returns a JSON response
@@ -145,6 +140,70 @@ async def get_media_url(media_id):
     else:
         print("Media URL not found in the response.")
 
+async def get_media_info(media_id) -> dict:
+    """Graph media metadata: url, mime_type, sha256 and file_size (bytes), without downloading anything."""
+    headers = get_wa_headers()
+    response = await get_http_client(GRAPH_MEDIA).get(WaVariables.wa_dl_url.format(media_id=media_id), headers=headers)
+    response.raise_for_status()
+    return response.json()
+
+
+async def _fetch_range(url: str, byte_range: str, limit: int) -> bytes | None:
+    """Ranged GET that reads at most `limit` bytes; None if the CDN ignored the Range header."""
+    headers = {**get_wa_headers(), "Range": f"bytes={byte_range}"}
+    async with get_http_client(CDN).stream("GET", url, headers=headers) as response:
+        if response.status_code != 206:
+            return None
+        data = b""
+        async for chunk in response.aiter_bytes():
+            data += chunk
+            if len(data) >= limit:
+                break
+    return data[:limit]
+
+
+async def probe_remote_audio_duration(url: str, mime_type: str) -> float | None:
+    """Ogg duration from two small ranged reads (ID header page + last page); None when unknown."""
+    if not mime_type or "ogg" not in mime_type:
+        return None
+    try:
+        head = await _fetch_range(url, f"0-{OGG_HEAD_BYTES - 1}", OGG_HEAD_BYTES)
+        tail = await _fetch_range(url, f"-{OGG_TAIL_BYTES}", OGG_TAIL_BYTES) if head else None
+    except Exception as e:
+        logger.warning(f"Ranged probe of {url} failed: {e}")
+        return None
+    if not head or not tail:
+        return None
+    return ogg_duration_from_pages(head, tail)
+
+
+def media_sha256_to_b64(hex_digest: str | None) -> str | None:
+    """Graph media metadata gives sha256 as hex; webhooks and the transcription cache use base64."""
+    try:
+        return base64.b64encode(bytes.fromhex(hex_digest)).decode() if hex_digest else None
+    except ValueError:
+        logger.warning(f"Unexpected media sha256 {hex_digest!r}, not using it as a cache key")
+        return None
+
+
+async def audio_preflight(media_id: str, mime_type: str) -> dict:
+    """
+    Cheap look at an inbound audio before any download: Graph metadata for size/url/hash and,
+    for Ogg, the duration from ranged reads. Fields are None when they can't be determined;
+    sha256 is base64, like the webhook's audio.sha256.
+    """
+    info = await get_media_info(media_id)
+    media_url = info.get("url")
+    duration = await probe_remote_audio_duration(media_url, info.get("mime_type") or mime_type) if media_url else None
+    logger.info(f"audio preflight for {media_id}: size={info.get('file_size')} duration={duration}")
+    return {
+        "media_url": media_url,
+        "file_size": info.get("file_size"),
+        "sha256": media_sha256_to_b64(info.get("sha256")),
+        "duration": duration,
+    }
+
+
 @async_exception_handler
 async def link_new_phone_number(from_num: str, content: str):
     token_input = content.strip()
@@ -188,17 +247,23 @@ async def link_new_phone_number(from_num: str, content: str):
 @async_exception_handler
 async def download_media(url: str, file_path: str) -> dict:
     headers=get_wa_headers()
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, headers=headers)
-    response.raise_for_status()  # Raises exception for 4XX/5XX responses
+    part_path = f"{file_path}.part"
+    # Stream the CDN body to disk chunk by chunk; memory stays at one chunk regardless of media size
+    try:
+        async with get_http_client(CDN).stream("GET", url, headers=headers) as response:
+            response.raise_for_status()  # Raises exception for 4XX/5XX responses
 
-    mime_type = response.headers.get('Content-Type')
-    logging.info(f"MIME Type: {mime_type}")
+            mime_type = response.headers.get('Content-Type')
+            logging.info(f"MIME Type: {mime_type}")
+
+            async with aiofiles.open(part_path, 'wb') as file:
+                async for chunk in response.aiter_bytes(config.http.stream_chunk_size):
+                    await file.write(chunk)
+        os.replace(part_path, file_path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
 
-    # Save the binary content to a file
-    with open(file_path, 'wb') as file:
-        file.write(response.content)
-    
     logging.info(f"Media saved to {file_path}")
     return {"status": "success", "message": "downloaded!"}
 
@@ -212,22 +277,24 @@ async def upload_media_to_whatsapp(file_url: str, type=None) -> dict:
 
     # Now upload the file to WhatsApp
     if type == "document":
-        async with httpx.AsyncClient() as client:
-            file_response = await client.get(file_url)
-            file_response.raise_for_status()  # Ensure we got the file correctly
-            file_content = file_response.content
+        # Spool the source into memory up to spool_max_size, then to disk; httpx streams the multipart body from it
+        with tempfile.SpooledTemporaryFile(max_size=config.http.spool_max_size) as spooled:
+            async with get_http_client(CDN).stream("GET", file_url) as file_response:
+                file_response.raise_for_status()  # Ensure we got the file correctly
+                async for chunk in file_response.aiter_bytes(config.http.stream_chunk_size):
+                    spooled.write(chunk)
+            spooled.seek(0)
             files = {
-                'file': (file_name, file_content, 'application/pdf'),
+                'file': (file_name, spooled, 'application/pdf'),
                 'type': (None, 'document'),
                 'messaging_product': (None, 'whatsapp'),
             }
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, headers=headers, files=files)
-            if response.status_code == 200:
-                logging.info(f"Response from WhatsApp upload: {response.json()}")
-            json_resp = response.json()
-            media_id=json_resp['id']
-            return {"status": "success", "media_id": media_id}
+            response = await get_http_client(GRAPH_MEDIA).post(url, headers=headers, files=files)
+        if response.status_code == 200:
+            logging.info(f"Response from WhatsApp upload: {response.json()}")
+        json_resp = response.json()
+        media_id=json_resp['id']
+        return {"status": "success", "media_id": media_id}
 
 
     else:
@@ -238,8 +305,7 @@ async def upload_media_to_whatsapp(file_url: str, type=None) -> dict:
                 'type': (None, 'audio'),
                 'messaging_product': (None, 'whatsapp'),
             }
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, headers=headers, files=files)
+            response = await get_http_client(GRAPH_MEDIA).post(url, headers=headers, files=files)
 
         if response.status_code == 200:
             logging.info(f"Response from WhatsApp upload: {response.json()}")
@@ -249,24 +315,3 @@ async def upload_media_to_whatsapp(file_url: str, type=None) -> dict:
         else:
             logging.error(f"Failed to upload media to WhatsApp, status code: {response.status_code}, detail: {response.text}")
             return {"status": "error", "detail": "Failed to upload media to WhatsApp"}
-
-@async_exception_handler
-async def cleanup_audio_files(ogg_in_file_path, mp3_in_file_path):
-    files_to_delete = [ogg_in_file_path, mp3_in_file_path]
-    logger.info(f"Attempting to clean up files: {files_to_delete}")
-
-    for file_path in files_to_delete:
-        try:
-            # Ensure the file exists before trying to delete it
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                logger.info(f"Successfully deleted {file_path}")
-            else:
-                logger.warning(f"File not found, could not delete: {file_path}")
-                return {'status': 'warning'}
-        except Exception as e:
-            logger.error(f"Failed to delete {file_path} due to: {e}")
-            return {'status': 'error'}
-    return {'status': 'success'}
-
-
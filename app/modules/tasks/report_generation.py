@@ -5,14 +5,15 @@ from app.config.auth_config import (
     supabase_client as supabase,
     set_supabase_service_role,
 )
-from app.core.ai_client import get_openai_client
+from app.core.ai_client import get_async_openai_client
 from app.config import config
-import logging, time, random
+from app.modules.services.reports.report_engine import ChapterJob, ChapterResult, build_chapter_jobs, run_chapter_graph
+from app.modules.services.reports.report_prompts import build_chapter_messages
+from app.modules.services.reports.report_events import publish_report_event
+import asyncio, logging, random, time
 
 logger = logging.getLogger(__name__)
 
-openai = get_openai_client()
-
 LOREM_TEXTS = [
     "Lorem ipsum dolor sit amet, consectetur adipiscing elit. Integer nec odio. Praesent libero. Sed cursus ante dapibus diam.",
     "Sed nisi. Nulla quis sem at nibh elementum imperdiet. Duis sagittis ipsum. Praesent mauris.",
@@ -22,120 +23,209 @@ LOREM_TEXTS = [
 ]
 
 
-@celery_app.task
-def generate_report_chapter(chapter_data):
-    set_supabase_service_role(True)
-    try:
-        # Extract necessary data from chapter_data
-        report_type_id = chapter_data["report_type_id"]
-        user_answers = chapter_data["user_answers"]
-        prompt_template = chapter_data["prompt"]
-        report_id = chapter_data["report_id"]
-        chapter_id = chapter_data["chapter_id"]
-        chapter_prompt_id = chapter_data["chapter_prompt_id"]
-        order_index = chapter_data["order_index"]
-
-        # Combine answers into one string
-        answers_text = "\n".join(
-            [f"{a['question']}: {a['answer']}" for a in user_answers]
-        )
-        final_prompt = prompt_template.replace("{{answers}}", answers_text)
-
-        
-        # Generate chapter content using OpenAI API
-        ai_response = openai.chat.completions.create(
+def chapter_usage(ai_response) -> dict:
+    # a completion, or the final chunk of a stream
+    usage = ai_response.usage
+    if usage is None:
+        return {}
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": usage.prompt_tokens,
+        "cached_tokens": getattr(details, "cached_tokens", None) or 0,  # served from the provider's prompt cache
+        "completion_tokens": usage.completion_tokens,
+    }
+
+
+def chapter_row(report_id: str, job: ChapterJob, content: str, is_partial: bool) -> dict:
+    return {
+        "report_id": report_id,
+        "chapter_id": job.chapter_id,
+        "chapter_prompt_id": job.chapter_prompt_id,
+        "order_index": job.order_index,
+        "content": content,
+        "is_partial": is_partial,
+    }
+
+
+def chapter_event(job: ChapterJob, content: str, done: bool) -> dict:
+    return {
+        "type": "chapter",
+        "chapter_id": job.chapter_id,
+        "order_index": job.order_index,
+        "title": job.title,
+        "content": content,
+        "done": done,
+    }
+
+
+def chapter_delta_event(job: ChapterJob, delta: str, offset: int) -> dict:
+    # text appended since the last event, starting at `offset` characters into the chapter
+    return {
+        "type": "chapter",
+        "chapter_id": job.chapter_id,
+        "order_index": job.order_index,
+        "title": job.title,
+        "delta": delta,
+        "offset": offset,
+        "done": False,
+    }
+
+
+def checkpoint_chapter(report_id: str, job: ChapterJob, content: str):
+    supabase.table("report_chapters").upsert(
+        chapter_row(report_id, job, content, is_partial=True),
+        on_conflict="report_id,chapter_id"
+    ).execute()
+
+
+def save_chapter(report_id: str, job: ChapterJob, result: ChapterResult):
+    supabase.table("report_chapters").upsert(
+        {**chapter_row(report_id, job, result.content, is_partial=False), **result.usage},
+        on_conflict="report_id,chapter_id"
+    ).execute()
+    publish_report_event(report_id, chapter_event(job, result.content, done=True))
+
+    logger.info(f"Chapter {job.chapter_id} saved to report {report_id}")
+
+    # `increment_report_progress(p_report_id)`: UPDATE reports SET progress = progress + 1,
+    # status = CASE WHEN progress + 1 >= total_chapters THEN 'completed' ELSE status END
+    # WHERE id = p_report_id RETURNING progress, total_chapters, status
+    progress = supabase.rpc("increment_report_progress", {"p_report_id": report_id}).execute().data
+    if isinstance(progress, list):
+        progress = progress[0] if progress else None
+    if progress:
+        # same shape as GET /report/progress, for the SSE streams watching this report
+        publish_report_event(report_id, {
+            "type": "progress",
+            "progress": progress["progress"],
+            "total": progress["total_chapters"],
+            "status": progress["status"],
+            "chapter_id": job.chapter_id,
+        })
+
+
+def fail_report(report_id: str):
+    """Finish a report that can't complete: report and token go to 'failed' and the streams watching it end."""
+    report_res = supabase.table("reports").update({"status": "failed"}).eq("id", report_id).execute()
+    supabase.table("report_access_tokens").update({"status": "failed"}).eq("report_id", report_id).execute()
+    report = report_res.data[0] if report_res.data else {}
+    publish_report_event(report_id, {
+        "type": "progress",
+        "progress": report.get("progress"),
+        "total": report.get("total_chapters"),
+        "status": "failed",
+    })
+
+
+class ChapterStream:
+    """
+    A chapter as it streams in: the text added since the last event goes out to the report page every
+    stream_publish_interval seconds and the text so far into report_chapters (is_partial) every
+    checkpoint_interval. The full text is only sent once, in save_chapter's "done" event.
+    """
+    def __init__(self, report_id: str, job: ChapterJob):
+        self.report_id = report_id
+        self.job = job
+        self.parts: list[str] = []
+        self._unpublished: list[str] = []
+        self._published_len = 0
+        self._published_at = 0.0
+        self._checkpointed_at = time.monotonic()
+
+    @property
+    def content(self) -> str:
+        return "".join(self.parts)
+
+    async def add(self, delta: str):
+        self.parts.append(delta)
+        self._unpublished.append(delta)
+        now = time.monotonic()
+        if now - self._published_at >= config.reports.stream_publish_interval:
+            self._published_at = now
+            pending, offset = "".join(self._unpublished), self._published_len
+            self._unpublished.clear()
+            self._published_len += len(pending)
+            await asyncio.to_thread(
+                publish_report_event, self.report_id, chapter_delta_event(self.job, pending, offset)
+            )
+        if now - self._checkpointed_at >= config.reports.checkpoint_interval:
+            self._checkpointed_at = now
+            try:
+                await asyncio.to_thread(checkpoint_chapter, self.report_id, self.job, self.content)
+            except Exception as e:
+                # only a checkpoint; the chapter is saved in full when it finishes
+                logger.error(f"Checkpointing chapter {self.job.chapter_id} of report {self.report_id} failed: {e}")
+
+
+async def generate_report_async(report_data: dict):
+    report_id = report_data["report_id"]
+    jobs = build_chapter_jobs(report_data["chapters"])
+
+    # built once at /start-generation; the same prefix goes out with every chapter
+    report_res = await asyncio.to_thread(
+        supabase.table("reports").select("answers_context").eq("id", report_id).single().execute
+    )
+    answers_context = report_res.data["answers_context"]
+    openai = None if config.reports.mock else get_async_openai_client()
+
+    async def generate(job: ChapterJob, inputs: dict[str, str]) -> ChapterResult:
+        stream = ChapterStream(report_id, job)
+        if openai is None:
+            # Simulate OpenAI API delay, word by word
+            words = random.choice(LOREM_TEXTS).split()
+            for word in words:
+                await asyncio.sleep(config.reports.mock_delay / len(words))
+                await stream.add(word + " ")
+            return ChapterResult(stream.content.strip())
+        response = await openai.chat.completions.create(
             model=config.openai.model,
-            messages=[{"role": "user", "content": final_prompt}],
+            messages=build_chapter_messages(answers_context, job, inputs),
             temperature=config.openai.temperature,
             frequency_penalty=config.openai.frequency_penalty,
             presence_penalty=config.openai.presence_penalty,
+            stream=True,
+            stream_options={"include_usage": True},
         )
+        usage = {}
+        async for chunk in response:
+            if chunk.usage:
+                # only the last chunk carries usage
+                usage = chapter_usage(chunk)
+            if chunk.choices and chunk.choices[0].delta.content:
+                await stream.add(chunk.choices[0].delta.content)
+        logger.info(f"Chapter '{job.title}' of report {report_id}: {usage}")
+        return ChapterResult(stream.content.strip(), usage)
+
+    async def on_chapter_done(job: ChapterJob, result: ChapterResult):
+        # the supabase client is sync; keep the loop free for the other chapters' completions
+        await asyncio.to_thread(save_chapter, report_id, job, result)
 
-        content = ai_response.choices[0].message.content.strip()
-
-
-        supabase.table("report_chapters").insert({
-            "report_id": report_id,
-            "chapter_id": chapter_id,
-            "chapter_prompt_id": chapter_prompt_id,
-            "order_index": order_index,
-            "content": content
-        }).execute()
-
-        logger.info(f"Chapter {chapter_id} saved to report {report_id}")
-        
-        # Count how many chapters are already done for this report
-        done_count_res = supabase.table("report_chapters") \
-            .select("id", count="exact") \
-            .eq("report_id", report_id) \
-            .execute()
-
-        supabase.table("reports").update({
-            "progress": done_count_res.count
-        }).eq("id", report_id).execute()
-        
-        # Mark report as done if all chapters are completed
-        total_chapters_res = supabase.table("chapters").select("id").eq("report_type_id", report_type_id).execute()
-        if done_count_res.count == len(total_chapters_res.data):
-            supabase.table("reports").update({"status": "completed"}).eq("id", report_id).execute()
-
-
-    except Exception as e:
-        logger.error(f"Failed to generate chapter: {e}")
+    try:
+        done = await run_chapter_graph(jobs, generate, on_chapter_done, config.reports.max_concurrency)
     finally:
-        set_supabase_service_role(False)
-        
+        if openai is not None:
+            await openai.close()
+    logger.info(f"{'[MOCK] ' if openai is None else ''}Report {report_id}: {len(done)}/{len(jobs)} chapters generated")
+    if len(done) < len(jobs):
+        # increment_report_progress only completes a report once every chapter is in
+        await asyncio.to_thread(fail_report, report_id)
+
 
 @celery_app.task
-def generate_report_chapter_mock(chapter_data):
+def generate_report(report_data):
+    """
+    report_data: report_id, report_type_id, session_id and
+    chapters [{chapter_id, chapter_prompt_id, order_index, title, prompt}].
+    The answers come from reports.answers_context, stored when the report was created.
+    """
     set_supabase_service_role(True)
     try:
-        # Simulate OpenAI API delay
-        time.sleep(10)
-
-        # Extract necessary data
-        report_type_id = chapter_data["report_type_id"]
-        report_id = chapter_data["report_id"]
-        chapter_id = chapter_data["chapter_id"]
-        chapter_prompt_id = chapter_data["chapter_prompt_id"]
-        order_index = chapter_data["order_index"]
-
-        # Generate mock content
-        content = random.choice(LOREM_TEXTS)
-
-        # Insert into DB
-        supabase.table("report_chapters").insert({
-            "report_id": report_id,
-            "chapter_id": chapter_id,
-            "chapter_prompt_id": chapter_prompt_id,
-            "order_index": order_index,
-            "content": content
-        }).execute()
-
-        logger.info(f"[MOCK] Chapter {chapter_id} saved to report {report_id}")
-
-        # Update progress
-        done_count_res = supabase.table("report_chapters") \
-            .select("id", count="exact") \
-            .eq("report_id", report_id) \
-            .execute()
-
-        supabase.table("reports").update({
-            "progress": done_count_res.count
-        }).eq("id", report_id).execute()
-
-        # Complete if all chapters are done
-        total_chapters_res = supabase.table("chapters") \
-            .select("id") \
-            .eq("report_type_id", report_type_id) \
-            .execute()
-
-        if done_count_res.count == len(total_chapters_res.data):
-            supabase.table("reports").update({
-                "status": "completed"
-            }).eq("id", report_id).execute()
-
+        asyncio.run(generate_report_async(report_data))
     except Exception as e:
-        logger.error(f"[MOCK] Failed to generate chapter: {e}")
+        logger.error(f"Failed to generate report {report_data.get('report_id')}: {e}")
+        try:
+            fail_report(report_data["report_id"])
+        except Exception as e:
+            logger.error(f"Marking report {report_data.get('report_id')} failed didn't work either: {e}")
     finally:
-        set_supabase_service_role(False)
\ No newline at end of file
+        set_supabase_service_role(False)
@@ -0,0 +1,186 @@
+# app/modules/voice/audio_pipeline.py
+# Audio prep for Whisper: no conversion for formats it accepts, Ogg duration from the container
+# headers, and any ffmpeg/ffprobe work as capped async subprocesses instead of pydub in the event loop.
+import asyncio, logging, os, re, struct
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+# Formats the transcription endpoint takes as-is
+WHISPER_FORMATS = {"flac", "m4a", "mp3", "mp4", "mpeg", "mpga", "oga", "ogg", "wav", "webm"}
+OGG_FORMATS = {"ogg", "oga", "opus"}
+CODEC_ARGS = {
+    "mp3": ["-c:a", "libmp3lame", "-q:a", "4"],
+    "ogg": ["-c:a", "libopus", "-b:a", "32k"],  # WhatsApp voice notes are Ogg/Opus
+}
+
+OGG_PAGE_HEADER = struct.Struct("<4sBBqIIIB")  # capture, version, type, granule, serial, seq, crc, segments
+OGG_HEAD_BYTES = 4096  # the ID header is always on the first page
+OGG_TAIL_BYTES = 64 * 1024  # the last page of a voice note is far smaller than this
+OPUS_RATE = 48000
+
+_ffmpeg_slots: asyncio.Semaphore | None = None
+
+
+def _extension(file_path: str) -> str:
+    return os.path.splitext(file_path)[1].lower().lstrip(".")
+
+
+def _first_page_payload(data: bytes) -> bytes | None:
+    if len(data) < OGG_PAGE_HEADER.size or data[:4] != b"OggS":
+        return None
+    segments = OGG_PAGE_HEADER.unpack_from(data)[7]
+    lacing = data[OGG_PAGE_HEADER.size:OGG_PAGE_HEADER.size + segments]
+    start = OGG_PAGE_HEADER.size + segments
+    return data[start:start + sum(lacing)]
+
+
+def _last_granule(tail: bytes, serial: int) -> int | None:
+    pos = tail.rfind(b"OggS")
+    while pos != -1:
+        if pos + OGG_PAGE_HEADER.size <= len(tail):
+            _, _, _, granule, page_serial, _, _, _ = OGG_PAGE_HEADER.unpack_from(tail, pos)
+            if page_serial == serial and granule >= 0:
+                return granule
+        pos = tail.rfind(b"OggS", 0, pos)
+    return None
+
+
+def ogg_duration_from_pages(head: bytes, tail: bytes) -> float | None:
+    """
+    Duration of an Ogg Opus/Vorbis stream from its first bytes (ID header) and last bytes
+    (last page): the last granule position is the sample count (48 kHz for Opus, minus the
+    pre-skip). None if not parseable.
+    """
+    payload = _first_page_payload(head)
+    if not payload:
+        return None
+    serial = OGG_PAGE_HEADER.unpack_from(head)[4]
+    if payload.startswith(b"OpusHead") and len(payload) >= 12:
+        rate, offset = OPUS_RATE, struct.unpack_from("<H", payload, 10)[0]
+    elif payload.startswith(b"\x01vorbis") and len(payload) >= 16:
+        rate, offset = struct.unpack_from("<I", payload, 12)[0], 0
+    else:
+        return None
+
+    granule = _last_granule(tail, serial)
+    if granule is None or not rate:
+        return None
+    return max(0, granule - offset) / rate
+
+
+def read_ogg_duration(file_path: str) -> float | None:
+    try:
+        size = os.path.getsize(file_path)
+        with open(file_path, "rb") as f:
+            head = f.read(OGG_HEAD_BYTES)
+            f.seek(max(0, size - OGG_TAIL_BYTES))
+            tail = f.read()
+    except OSError:
+        return None
+    return ogg_duration_from_pages(head, tail)
+
+
+async def run_media_command(*args: str) -> tuple[int, bytes, bytes]:
+    """Run ffmpeg/ffprobe without blocking the loop; at most max_ffmpeg_procs run at once."""
+    global _ffmpeg_slots
+    if _ffmpeg_slots is None:
+        _ffmpeg_slots = asyncio.Semaphore(config.audio.max_ffmpeg_procs)
+    async with _ffmpeg_slots:
+        proc = await asyncio.create_subprocess_exec(
+            *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await proc.communicate()
+    return proc.returncode, stdout, stderr
+
+
+async def probe_duration(file_path: str) -> float:
+    if _extension(file_path) in OGG_FORMATS:
+        duration = read_ogg_duration(file_path)
+        if duration is not None:
+            return duration
+    returncode, stdout, stderr = await run_media_command(
+        config.audio.ffprobe_bin, "-v", "error", "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1", file_path
+    )
+    if returncode != 0:
+        raise RuntimeError(f"ffprobe failed for {file_path}: {stderr.decode(errors='replace')[-500:]}")
+    return float(stdout.strip() or 0)
+
+
+async def transcode(file_path: str, target_format: str, output_dir: str) -> dict:
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    new_file_path = os.path.join(output_dir, f"{base_name}.{target_format}")
+    returncode, _, stderr = await run_media_command(
+        config.audio.ffmpeg_bin, "-hide_banner", "-loglevel", "error", "-y", "-i", file_path,
+        "-vn", *CODEC_ARGS.get(target_format, []), new_file_path
+    )
+    if returncode != 0:
+        logger.error(f"ffmpeg failed converting {file_path} to {target_format}: {stderr.decode(errors='replace')[-500:]}")
+        return {"status": "error", "message": "conversion failed"}
+    logger.info(f"File converted successfully to {target_format}. and stored in {new_file_path}")
+    return {"status": "success", "file_path": new_file_path}
+
+
+async def prepare_for_transcription(file_path: str, output_dir: str) -> dict:
+    """
+    Returns the file to send to Whisper and its duration. Supported formats are passed
+    through untouched ("converted" False); anything else is transcoded to mp3 in output_dir.
+    """
+    converted = False
+    if _extension(file_path) not in WHISPER_FORMATS:
+        result = await transcode(file_path, "mp3", output_dir)
+        if result["status"] != "success":
+            return result
+        file_path, converted = result["file_path"], True
+    duration = await probe_duration(file_path)
+    return {"status": "success", "file_path": file_path, "duration": duration, "converted": converted}
+
+
+async def split_audio(file_path: str, duration: float, output_dir: str, window: float, overlap: float) -> list[str]:
+    """
+    Cut the file into `window`-second segments that overlap by `overlap` seconds (stream copy,
+    no re-encode). Segments are returned in playback order.
+    """
+    ext = _extension(file_path)
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    step = max(window - overlap, 1.0)
+    starts, start = [], 0.0
+    while start == 0.0 or start + overlap < duration:
+        starts.append(start)
+        start += step
+
+    async def cut(index: int, offset: float) -> str:
+        segment_path = os.path.join(output_dir, f"{base_name}_part{index:03d}.{ext}")
+        returncode, _, stderr = await run_media_command(
+            config.audio.ffmpeg_bin, "-hide_banner", "-loglevel", "error", "-y",
+            "-ss", f"{offset:.3f}", "-t", f"{window:.3f}", "-i", file_path, "-vn", "-c", "copy", segment_path
+        )
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg failed cutting {file_path} at {offset}s: {stderr.decode(errors='replace')[-500:]}")
+        return segment_path
+
+    return list(await asyncio.gather(*(cut(i, offset) for i, offset in enumerate(starts))))
+
+
+def _normalize_word(word: str) -> str:
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def stitch_transcripts(parts: list[str], max_overlap_words: int = 30) -> str:
+    """
+    Join segment transcripts in order, dropping the words the overlap made Whisper transcribe twice:
+    the longest run (2+ words) that ends one segment and starts the next is kept only once.
+    """
+    words: list[str] = []
+    for part in parts:
+        next_words = part.split()
+        if words and next_words:
+            tail = [_normalize_word(w) for w in words[-max_overlap_words:]]
+            head = [_normalize_word(w) for w in next_words[:max_overlap_words]]
+            for size in range(min(len(tail), len(head)), 1, -1):
+                if tail[-size:] == head[:size]:
+                    next_words = next_words[size:]
+                    break
+        words.extend(next_words)
+    return " ".join(words)
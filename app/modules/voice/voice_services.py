@@ -1,39 +1,26 @@
-import asyncio, logging, aiofiles, os
-from pydub.utils import mediainfo
+import asyncio, logging
 from app.config.openai_config import client
-from app.utils.common_utils import async_exception_handler, generate_filename, convert_media
-from app.modules.services.whatsapp.whatsapp_utils import cleanup_audio_files, get_media_url, download_media
+from app.utils.common_utils import async_exception_handler, generate_filename
+from app.modules.voice.audio_pipeline import prepare_for_transcription, probe_duration
+from app.modules.services.whatsapp.whatsapp_utils import get_media_url, download_media
+from app.utils.scratch_space import scratch_space
 
-from app.config.general_config import MediaDirSettings
+from app.config import config
 
 
 logger = logging.getLogger(__name__)
 
 @async_exception_handler
-async def perform_stt(mp3_file_path) -> dict:
+async def perform_stt(audio_file_path, duration: float = None) -> dict:
     logger.info("in perform STT")
-    duration = 0.00
     try:
-        # Get the file length in seconds
-        audio_info = mediainfo(mp3_file_path)
-        logger.info(f'audio_info: {audio_info}')
-        duration = float(audio_info.get('duration'))
+        # Get the file length in seconds (from the container headers when possible)
+        if duration is None:
+            duration = await probe_duration(audio_file_path)
         logger.info(f"Audio duration: {duration} seconds")
 
-        # Chunk size in bytes
-        chunk_size = 5 * 1024 * 1024  # 5 MB
-
-        # Use aiofiles to read the file in chunks and write to a combined file
-        combined_file_path = "./tmp/combined_audio.mp3"
-        async with aiofiles.open(mp3_file_path, "rb") as audio_file, aiofiles.open(combined_file_path, "wb") as combined_file:
-            while True:
-                chunk = await audio_file.read(chunk_size)
-                if not chunk:
-                    break
-                await combined_file.write(chunk)
-
-        # Use synchronous file handling for the OpenAI API
-        with open(combined_file_path, "rb") as audio_file:
+        # The file goes to the API as-is; Whisper reads the format from the file name
+        with open(audio_file_path, "rb") as audio_file:
             transcription = await client.audio.transcriptions.create(
                 model="whisper-1", 
                 file=audio_file,
@@ -58,21 +45,21 @@ async def transcribe_audio(audio_id: str, message_id: str, mime_type: str = None
 
     logger.info(f"media_url: {media_url}")
 
-    # Download as OGG
-    ogg_in_filename = generate_filename(message_id=message_id, audio_id=audio_id, extension=mime_type.split('/')[1].split(';')[0])
-    ogg_in_file_path = os.path.join(MediaDirSettings.incoming_ogg_dir, ogg_in_filename)
+    async with scratch_space.job("stt", reserve_bytes=config.scratch.audio_reserve_mb * 1024 * 1024) as job:
+        # Download as OGG
+        ogg_in_filename = generate_filename(message_id=message_id, audio_id=audio_id, extension=mime_type.split('/')[1].split(';')[0])
+        ogg_in_file_path = job.path(ogg_in_filename)
 
-    download_status = await download_media(url=media_url, file_path=ogg_in_file_path)
-    if download_status['status'] != "success":
-        return {'status': 'error'}
+        download_status = await download_media(url=media_url, file_path=ogg_in_file_path)
+        if download_status['status'] != "success":
+            return {'status': 'error'}
 
-    conversion_result = await convert_media(file_path=ogg_in_file_path, target_format="mp3", output_dir=MediaDirSettings.incoming_mp3_dir)
-    if conversion_result['status'] != "success":
-        return {'status': 'error'}
-    mp3_in_file_path = conversion_result['file_path']
+        prepared = await prepare_for_transcription(file_path=ogg_in_file_path, output_dir=job.dir)
+        if prepared['status'] != "success":
+            return {'status': 'error'}
 
-    # Perform speech-to-text
-    transcribed_message_resp = await perform_stt(mp3_in_file_path)
+        # Perform speech-to-text
+        transcribed_message_resp = await perform_stt(prepared['file_path'], duration=prepared['duration'])
     if transcribed_message_resp['status'] == "error":
         return {'status': 'error'}
     
@@ -81,8 +68,6 @@ async def transcribe_audio(audio_id: str, message_id: str, mime_type: str = None
     return {
         'status': transcribed_message_resp['status'],
         'data': transcribed_message_resp['data'],
-        'ogg_in_file_path': ogg_in_file_path,
-        'mp3_in_file_path': mp3_in_file_path,
         'duration': transcribed_message_resp['duration']
     }
 
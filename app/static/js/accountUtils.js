@@ -240,55 +240,111 @@ export function getTaskStatus(tokenId, card) {
     const statusLabel = card.querySelector('.token-status-label');
     const startButton = card.querySelector('.btn');
 
-    async function checkProgress() {
-        try {
-            const res = await fetch(`/report/progress/${tokenId}`);
-            if (!res.ok) throw new Error("Failed to get progress");
-            const data = await res.json();
-
-            const percentage = Math.round((data.progress / data.total) * 100);
+    let interval = null;
+    let source = null;
+
+    function showProgress(data) {
+        if (data.type === 'error') {
+            // the stream can't continue (e.g. the token is gone); don't let EventSource reconnect
+            clearInterval(interval);
+            if (source) source.close();
+            console.error("Progress stream error", data.message);
+            return;
+        }
 
-            // Show and update the progress bar
-            progressContainer.style.display = 'block';
-            progressBar.style.width = `${percentage}%`;
-            progressBar.setAttribute('aria-valuenow', percentage);
-            progressLabel.innerText = `Progress: ${percentage}%`;
+        if (data.status === 'failed') {
+            clearInterval(interval);
+            if (source) source.close();
+            card.classList.remove("disabled-card");
+            progressContainer.style.display = 'none';
 
-            // Update badge text
             if (statusLabel) {
-                statusLabel.innerText = 'Processing...';
-                statusLabel.classList.remove('bg-warning', 'bg-primary');
-                statusLabel.classList.add('bg-success');
+                statusLabel.innerText = 'Failed';
+                statusLabel.classList.remove('bg-warning', 'bg-primary', 'bg-success');
+                statusLabel.classList.add('bg-danger');
             }
 
-            // Show spinner on button
             if (startButton && startButton.tagName.toLowerCase() === 'button') {
-                startButton.innerHTML = `<span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span> Processing...`;
+                startButton.innerHTML = 'Generation failed';
                 startButton.disabled = true;
             }
+            return;
+        }
+
+        const percentage = Math.round((data.progress / data.total) * 100);
+
+        // Show and update the progress bar
+        progressContainer.style.display = 'block';
+        progressBar.style.width = `${percentage}%`;
+        progressBar.setAttribute('aria-valuenow', percentage);
+        progressLabel.innerText = `Progress: ${percentage}%`;
+
+        // Chapters stream into the report page while it's generated, so it can be opened right away
+        if (data.report_id && !progressContainer.querySelector('.live-report-link')) {
+            const liveLink = document.createElement('a');
+            liveLink.className = 'live-report-link small';
+            liveLink.href = `/report/${data.report_id}`;
+            liveLink.textContent = 'Read as it is written';
+            progressContainer.appendChild(liveLink);
+        }
+
+        // Update badge text
+        if (statusLabel) {
+            statusLabel.innerText = 'Processing...';
+            statusLabel.classList.remove('bg-warning', 'bg-primary');
+            statusLabel.classList.add('bg-success');
+        }
+
+        // Show spinner on button
+        if (startButton && startButton.tagName.toLowerCase() === 'button') {
+            startButton.innerHTML = `<span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span> Processing...`;
+            startButton.disabled = true;
+        }
 
-            if (data.status === 'completed') {
-                clearInterval(interval);
-                card.classList.remove("disabled-card");
-                progressContainer.style.display = 'none';
-
-                // Replace button with link
-                if (startButton) {
-                    startButton.outerHTML = `<a class="btn btn-primary mt-auto" href="/report/${data.report_id}" role="button">To Report</a>`;
-                }
-
-                if (statusLabel) {
-                    statusLabel.innerText = 'Done';
-                    statusLabel.classList.remove('bg-warning');
-                    statusLabel.classList.add('bg-success');
-                }
+        if (data.status === 'completed') {
+            clearInterval(interval);
+            if (source) source.close();
+            card.classList.remove("disabled-card");
+            progressContainer.style.display = 'none';
+
+            // Replace button with link
+            if (startButton) {
+                startButton.outerHTML = `<a class="btn btn-primary mt-auto" href="/report/${data.report_id}" role="button">To Report</a>`;
+            }
+
+            if (statusLabel) {
+                statusLabel.innerText = 'Done';
+                statusLabel.classList.remove('bg-warning');
+                statusLabel.classList.add('bg-success');
             }
+        }
+    }
+
+    async function checkProgress() {
+        try {
+            const res = await fetch(`/report/progress/${tokenId}`);
+            if (!res.ok) throw new Error("Failed to get progress");
+            showProgress(await res.json());
         } catch (err) {
             console.error("Progress check error", err);
         }
     }
 
-    const interval = setInterval(checkProgress, 8000);
-    checkProgress();
+    if (!window.EventSource) {
+        interval = setInterval(checkProgress, 8000);
+        checkProgress();
+        return;
+    }
+
+    // The server pushes one event per finished chapter; EventSource reconnects on its own
+    // and the stream starts with the current progress each time
+    source = new EventSource(`/report/progress/${tokenId}/stream`);
+    source.onmessage = (event) => {
+        try {
+            showProgress(JSON.parse(event.data));
+        } catch (err) {
+            console.error("Progress event error", err);
+        }
+    };
 }
 
@@ -1,26 +1,30 @@
 // static/js/archive_page.js
-import { initCalendar } from '/static/js/calendar.js';
+import { initCalendar, expandEntryDateBitmap } from '/static/js/calendar.js';
 import { setupMobileSidebar } from '/static/js/mobile_ui.js';
 
-let journalDates = [];       // for calendar
 let journalListCache = [];   // for list view
-
-async function fetchJournalDates() {
-    try {
-        const res = await fetch('/api/journal/all_dates');
-        const { dates } = await res.json();
-        journalDates = dates;
-        console.log('[Archive] Loaded journal dates:', journalDates);
-    } catch (err) {
-        console.error("[Archive] Failed to fetch journal dates", err);
-    }
+let nextCursor = null;       // keyset cursor for the next page of the list view
+
+// the calendar asks for one month at a time
+async function fetchJournalDates(year, monthIndex) {
+    const pad = n => String(n).padStart(2, '0');
+    const lastDay = new Date(year, monthIndex + 1, 0).getDate();
+    const start = `${year}-${pad(monthIndex + 1)}-01`;
+    const end = `${year}-${pad(monthIndex + 1)}-${pad(lastDay)}`;
+    const res = await fetch(`/api/journal/all_dates?format=bitmap&start=${start}&end=${end}`);
+    if (!res.ok) throw new Error("Failed to get journal dates");
+    const { months } = await res.json();
+    return expandEntryDateBitmap(months);
 }
 
 async function fetchPaginatedEntries() {
     try {
-        const res = await fetch('/api/journal/paginated?page=1&limit=10');
-        const { entries } = await res.json();
-        journalListCache = entries;
+        const params = new URLSearchParams({ limit: 10 });
+        if (nextCursor) params.set('cursor', nextCursor);
+        const res = await fetch(`/api/journal/paginated?${params}`);
+        const { entries, next_cursor } = await res.json();
+        journalListCache = journalListCache.concat(entries);
+        nextCursor = next_cursor;
     } catch (err) {
         console.error("[Archive] Failed to fetch paginated entries", err);
     }
@@ -97,6 +101,18 @@ function renderListView() {
 
         container.appendChild(card);
     });
+
+    if (nextCursor) {
+        const loadMore = document.createElement("button");
+        loadMore.className = "btn btn-outline-secondary d-block mx-auto mb-4";
+        loadMore.textContent = "Load more";
+        loadMore.addEventListener("click", async () => {
+            loadMore.disabled = true;
+            await fetchPaginatedEntries();
+            renderListView();
+        });
+        container.appendChild(loadMore);
+    }
 }
 
 function setupViewToggles() {
@@ -128,7 +144,7 @@ function setupViewToggles() {
 
 export async function initArchivePage() {
     setupMobileSidebar();
-    await Promise.all([fetchJournalDates(), fetchPaginatedEntries()]);
+    await fetchPaginatedEntries();
 
     // show the calendar by default
     document.getElementById("calendar-container-wrapper").classList.remove("d-none");
@@ -141,7 +157,7 @@ export async function initArchivePage() {
         rightArrowSelector: ".right",
         selectedOutputSelector: ".selected",
         onDateSelect: loadJournalEntry,
-        journalEntryDates: journalDates
+        loadMonth: fetchJournalDates
     });
 
     setupViewToggles();
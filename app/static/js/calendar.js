@@ -1,4 +1,15 @@
 // calendar.js
+// Expand /api/journal/all_dates?format=bitmap ({"YYYY-MM": mask}, bit day-1) into ISO date strings
+export function expandEntryDateBitmap(months) {
+    const dates = [];
+    Object.entries(months || {}).forEach(([month, mask]) => {
+        for (let day = 1; mask > 0; day++, mask = Math.floor(mask / 2)) {
+            if (mask % 2) dates.push(`${month}-${String(day).padStart(2, '0')}`);
+        }
+    });
+    return dates;
+}
+
 export function initCalendar({
     displaySelector,
     daysContainerSelector,
@@ -6,7 +17,8 @@ export function initCalendar({
     rightArrowSelector,
     selectedOutputSelector,
     onDateSelect = () => { },
-    journalEntryDates = [] // e.g. ["2025-06-14", "2025-06-02"]
+    journalEntryDates = [], // e.g. ["2025-06-14", "2025-06-02"]
+    loadMonth = null // optional async (year, monthIndex) => entry dates of that month, fetched as it is shown
 }) {
     const display = document.querySelector(displaySelector);
     const days = document.querySelector(daysContainerSelector);
@@ -18,6 +30,24 @@ export function initCalendar({
     let year = date.getFullYear();
     let month = date.getMonth();
 
+    const entryDates = new Set(journalEntryDates);
+    const loadedMonths = new Set();
+
+    async function ensureMonthLoaded() {
+        const key = `${year}-${month}`;
+        if (!loadMonth || loadedMonths.has(key)) return;
+        loadedMonths.add(key);
+        try {
+            (await loadMonth(year, month)).forEach(d => entryDates.add(d));
+        } catch (err) {
+            loadedMonths.delete(key);
+            console.error("[Calendar] Failed to load entry dates", err);
+            return;
+        }
+        // still on that month: show its entries
+        if (key === `${year}-${month}`) renderCalendar();
+    }
+
     function renderCalendar() {
         days.innerHTML = "";
         selected.innerHTML = "";
@@ -68,7 +98,7 @@ export function initCalendar({
                 }
 
                 // Highlight entry dates
-                if (journalEntryDates.includes(isoString)) {
+                if (entryDates.has(isoString)) {
                     dayDiv.classList.add("has-entry");
                 }
 
@@ -100,6 +130,7 @@ export function initCalendar({
         }
         date.setMonth(month);
         renderCalendar();
+        ensureMonthLoaded();
     }
 
     function goToNextMonth() {
@@ -111,10 +142,12 @@ export function initCalendar({
         }
         date.setMonth(month);
         renderCalendar();
+        ensureMonthLoaded();
     }
 
     if (previous) previous.addEventListener("click", goToPreviousMonth);
     if (next) next.addEventListener("click", goToNextMonth);
 
     renderCalendar();
+    ensureMonthLoaded();
 }
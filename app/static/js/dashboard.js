@@ -1,4 +1,6 @@
 // static/js/dashboard.js
+import { expandEntryDateBitmap } from '/static/js/calendar.js';
+
 export async function initializeJournalDashboard() {
     const button = document.getElementById("start-writing-btn");
     // const container = document.getElementById("today-entry-container");
@@ -8,8 +10,9 @@ export async function initializeJournalDashboard() {
 
     try {
         console.log("init dashboard")
-        const dates_res = await fetch("/api/journal/all_dates");
-        const { dates } = await dates_res.json();
+        const dates_res = await fetch("/api/journal/all_dates?format=bitmap");
+        const { months } = await dates_res.json();
+        const dates = expandEntryDateBitmap(months);
         const dateSet = new Set(dates);
 
         // Total entries
@@ -4,6 +4,8 @@ let autosaveTimer = null;
 let lastSavedContent = "";
 let characterBuffer = "";
 let saveStatusTimeout = null;
+let entryVersion = 0;        // journal_entries.version this editor last saw; sent with every save
+let entryConflict = false;   // the entry changed elsewhere; stop autosaving until reload
 
 
 export async function loadJournalEntryFromDOM() {
@@ -14,7 +16,7 @@ export async function loadJournalEntryFromDOM() {
 
     if (!textarea || !titleEl) return;
 
-    let entryId, entryDate, entryDateDisplay, content;
+    let entryId, entryDate, entryDateDisplay, content, version, unsavedContent;
     // Get current local date in ISO format
     const localDate = new Date().toISOString().slice(0, 10);
 
@@ -38,6 +40,8 @@ export async function loadJournalEntryFromDOM() {
             entryDate = data.entry_date;
             entryDateDisplay = data.entry_date_display;
             content = data.content || "";
+            version = data.version || 0;
+            unsavedContent = data.unsaved_content;
         } catch (err) {
             console.error("Failed to fetch/create today's entry", err);
             return;
@@ -60,6 +64,8 @@ export async function loadJournalEntryFromDOM() {
             entryDate = jsonres.data.entry_date;
             entryDateDisplay = jsonres.data.entry_date;
             content = jsonres.data.content || "";
+            version = jsonres.data.version || 0;
+            unsavedContent = jsonres.data.unsaved_content;
         } catch (err) {
             console.error("Failed to load entry:", err);
             return;
@@ -70,8 +76,16 @@ export async function loadJournalEntryFromDOM() {
     textarea.disabled = false;
     textarea.value = decodeHtmlEntities(content || "");
     lastSavedContent = content;
+    entryVersion = version;
     textarea.dataset.entryId = entryId;
 
+    // An earlier autosave lost a race with another edit: put its text back below the current entry,
+    // the next save stores both
+    if (unsavedContent && unsavedContent !== textarea.value) {
+        textarea.value = `${textarea.value}\n\n${decodeHtmlEntities(unsavedContent)}`;
+        showSaveStatus("Restored text that couldn't be saved earlier ⚠️", true);
+    }
+
 
     // Set title based on entry date
     const entryDateObj = new Date(entryDate);
@@ -167,23 +181,31 @@ function decodeHtmlEntities(text) {
     return div.textContent;
 }
 
-export async function saveJournalContent(textarea) {
+export async function saveJournalContent(textarea, { flush = false } = {}) {
     const currentContent = textarea.value.trim();
     const entryId = textarea.dataset.entryId;
 
-    if (!entryId || currentContent === lastSavedContent) return;
+    if (!entryId || entryConflict || currentContent === lastSavedContent) return;
 
     try {
+        // the server buffers autosaves and writes them once typing pauses; flush asks for the next tick
         const response = await fetch(`/api/journal/entry/${entryId}`, {
             method: "PATCH",
             headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ content: currentContent }),
+            body: JSON.stringify({ content: currentContent, version: entryVersion, flush }),
+            keepalive: flush,
         });
 
         if (response.ok) {
+            const data = await response.json();
+            entryVersion = data.version;
             lastSavedContent = currentContent;
             characterBuffer = "";
             showSaveStatus("Saved ✅");
+        } else if (response.status === 409) {
+            entryConflict = true;
+            clearTimeout(autosaveTimer);
+            showSaveStatus("This entry was changed elsewhere. Copy your text and reload ⚠️", true);
         } else {
             showSaveStatus("Failed to save ❌", true);
         }
@@ -198,7 +220,7 @@ function setupManualSave(textarea) {
     if (!button) return;
 
     button.addEventListener("click", () => {
-        saveJournalContent(textarea);
+        saveJournalContent(textarea, { flush: true });
     });
 }
 
@@ -237,7 +259,7 @@ function setupBackButton(textarea) {
         // Only save if changed
         if (entryId && currentContent !== lastSavedContent) {
             try {
-                await saveJournalContent(textarea);
+                await saveJournalContent(textarea, { flush: true });
             } catch (err) {
                 console.warn("Autosave failed before back nav:", err);
             }
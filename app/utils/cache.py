@@ -0,0 +1,78 @@
+import threading, time
+from collections import OrderedDict
+from app.config import config
+
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries expire after a TTL (per cache or per entry)."""
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float | None = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item[0] if item else default
+
+    def pop_where(self, predicate) -> int:
+        """Drop every entry whose value matches predicate(value); returns how many were removed."""
+        with self._lock:
+            keys = [k for k, (v, _) in self._data.items() if predicate(v)]
+            for k in keys:
+                del self._data[k]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# users + user_settings rows keyed by auth `sub`
+user_profile_cache = TTLCache(maxsize=config.app.user_cache_size, ttl=config.app.user_cache_ttl)
+
+
+def invalidate_user_profile(user_id: str = None, sub: str = None):
+    """Forget a cached profile after the users / user_settings row changed."""
+    if sub:
+        user_profile_cache.pop(sub)
+    if user_id:
+        user_profile_cache.pop_where(lambda profile: str(profile.get("id")) == str(user_id))
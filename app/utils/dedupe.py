@@ -0,0 +1,86 @@
+import hashlib, math, threading, time
+from app.config import config
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter sized for `capacity` items at the requested false-positive rate."""
+    def __init__(self, capacity: int, fp_rate: float):
+        self.size = max(8, math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class TimeBucketedBloomFilter:
+    """
+    Bloom filters rotated per time bucket so memory stays bounded: items older than
+    `buckets * bucket_seconds` age out. `ready` stays False until the filter has been
+    warmed, and callers must not trust a negative answer before that.
+    """
+    def __init__(self, capacity_per_bucket: int, fp_rate: float, bucket_seconds: int, buckets: int):
+        self.capacity_per_bucket = capacity_per_bucket
+        self.fp_rate = fp_rate
+        self.bucket_seconds = bucket_seconds
+        self.buckets = buckets
+        self.ready = False
+        self.negatives = 0      # answered locally, no DB round trip
+        self.fallbacks = 0      # possible hit, confirmed against the DB
+        self.false_positives = 0
+        self._filters: dict[int, BloomFilter] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def window_seconds(self) -> int:
+        return self.bucket_seconds * self.buckets
+
+    def _rotate(self, current: int):
+        for key in [k for k in self._filters if k <= current - self.buckets]:
+            del self._filters[key]
+
+    def add(self, item: str, timestamp: float | None = None):
+        now_bucket = int(time.time() // self.bucket_seconds)
+        bucket = now_bucket if timestamp is None else int(timestamp // self.bucket_seconds)
+        if bucket <= now_bucket - self.buckets:
+            return
+        with self._lock:
+            self._rotate(now_bucket)
+            bloom = self._filters.get(bucket)
+            if bloom is None:
+                bloom = self._filters[bucket] = BloomFilter(self.capacity_per_bucket, self.fp_rate)
+            bloom.add(item)
+
+    def might_contain(self, item: str) -> bool:
+        with self._lock:
+            self._rotate(int(time.time() // self.bucket_seconds))
+            return any(item in bloom for bloom in self._filters.values())
+
+    def stats(self) -> dict:
+        checks = self.negatives + self.fallbacks
+        return {
+            "ready": self.ready,
+            "buckets": len(self._filters),
+            "negatives": self.negatives,
+            "fallbacks": self.fallbacks,
+            "false_positives": self.false_positives,
+            "local_rate": round(self.negatives / checks, 4) if checks else 0.0,
+        }
+
+
+# wamids of stored whatsapp_messages rows, warmed on startup
+wamid_index = TimeBucketedBloomFilter(
+    capacity_per_bucket=config.wamid_index.capacity_per_bucket,
+    fp_rate=config.wamid_index.fp_rate,
+    bucket_seconds=config.wamid_index.bucket_seconds,
+    buckets=config.wamid_index.buckets,
+)
@@ -6,7 +6,7 @@ logger = logging.getLogger(__name__)
 
 #sends text message and then logs to db
 #why is there no nudge? DEV DEV!!!
-async def wa_text_msg_handler(from_num: str, msg: str, user_id: str, tokens=0, qr_buttons=None):
+async def wa_text_msg_handler(from_num: str, msg: str, user_id: str, tokens=0, qr_buttons=None, context=None):
     try:
         max_chars = 4096
 
@@ -27,7 +27,11 @@ async def wa_text_msg_handler(from_num: str, msg: str, user_id: str, tokens=0, q
             logger.info(f"Sending WhatsApp message to {from_num} {type(from_num)}: {chunk}, {type(chunk)}")
             json_resp_wam = await send_whatsapp_message(to_number=from_num, message=chunk, qr_buttons=qr_buttons)
             message_id = json_resp_wam.get('messages', [{}])[0].get('id', 'unknown')
-            await insert_message(user_id=user_id, message_id=message_id, msg_content=chunk, incoming_tokens=tokens, msg_type="text", role="assistant", status="sent")
+            if context:
+                # written together with the rest of the message's changes when the context is committed
+                context.record_message(message_id=message_id, msg_content=chunk, incoming_tokens=tokens, msg_type="text", role="assistant", status="sent")
+            else:
+                await insert_message(user_id=user_id, message_id=message_id, msg_content=chunk, incoming_tokens=tokens, msg_type="text", role="assistant", status="sent")
 
         return {"status": "success"}
     except Exception as e:
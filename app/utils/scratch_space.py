@@ -0,0 +1,160 @@
+# app/utils/scratch_space.py
+# Per-job scratch directories for media work: unique paths (so concurrent jobs and workers never share a file),
+# tmpfs when available, a size quota, and cleanup on job exit plus a sweeper for anything a crash left behind.
+# Job directories are named <prefix>-<pid>-<hex> so the sweeper can tell a dead worker's leftovers from a live job.
+import asyncio, logging, os, shutil, threading, time, uuid
+from contextlib import asynccontextmanager
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+SHM_DIR = "/dev/shm"
+
+
+class ScratchSpaceFull(RuntimeError):
+    pass
+
+
+class ScratchJob:
+    def __init__(self, directory: str):
+        self.dir = directory
+
+    def path(self, filename: str) -> str:
+        return os.path.join(self.dir, os.path.basename(filename))
+
+
+class ScratchSpace:
+    def __init__(self, base_dir: str, prefer_shm: bool, quota_bytes: int, max_age: float, sweep_interval: float):
+        self.base_dir = base_dir
+        self.prefer_shm = prefer_shm
+        self.quota_bytes = quota_bytes
+        self.max_age = max_age
+        self.sweep_interval = sweep_interval
+        self._root: str | None = None
+        self._active: set[str] = set()
+        self._reserved = 0  # bytes promised to this process's live jobs
+        self._lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def root(self) -> str:
+        if self._root is None:
+            self._root = self._pick_root()
+            logger.info(f"Scratch space at {self._root} (quota {self.quota_bytes // (1024 * 1024)} MB)")
+        return self._root
+
+    def _pick_root(self) -> str:
+        if self.prefer_shm and os.path.isdir(SHM_DIR) and os.access(SHM_DIR, os.W_OK):
+            # only use RAM-backed storage if the whole quota fits in it
+            if shutil.disk_usage(SHM_DIR).free >= self.quota_bytes:
+                root = os.path.join(SHM_DIR, "purposequest-scratch")
+                os.makedirs(root, exist_ok=True)
+                return root
+        os.makedirs(self.base_dir, exist_ok=True)
+        return self.base_dir
+
+    def usage(self) -> int:
+        """Bytes on disk under the root, leaving out this process's live jobs (their reservation counts instead)."""
+        total = 0
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if dirpath == self.root:
+                dirnames[:] = [name for name in dirnames if os.path.join(dirpath, name) not in self._active]
+            for name in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, name))
+                except OSError:
+                    pass  # removed while we were walking
+        return total
+
+    def _reserve(self, used: int, reserve_bytes: int) -> bool:
+        with self._lock:
+            if used + self._reserved + reserve_bytes > self.quota_bytes:
+                return False
+            self._reserved += reserve_bytes
+            return True
+
+    def _release(self, reserve_bytes: int):
+        with self._lock:
+            self._reserved -= reserve_bytes
+
+    @asynccontextmanager
+    async def job(self, prefix: str = "job", reserve_bytes: int = 0):
+        """Yield a fresh ScratchJob; its directory and everything in it is removed on exit."""
+        # the reservation is taken before any file exists, so concurrent jobs can't all pass the same check
+        if not self._reserve(await asyncio.to_thread(self.usage), reserve_bytes):
+            await asyncio.to_thread(self.sweep)
+            if not self._reserve(await asyncio.to_thread(self.usage), reserve_bytes):
+                raise ScratchSpaceFull(f"Scratch space quota of {self.quota_bytes} bytes reached")
+        try:
+            directory = os.path.join(self.root, f"{prefix}-{os.getpid()}-{uuid.uuid4().hex}")
+            os.makedirs(directory)
+            self._active.add(directory)
+            try:
+                yield ScratchJob(directory)
+            finally:
+                self._active.discard(directory)
+                shutil.rmtree(directory, ignore_errors=True)
+        finally:
+            self._release(reserve_bytes)
+
+    @staticmethod
+    def _owner_alive(name: str) -> bool:
+        """Whether the process named in a job directory still runs; unnamed (older) directories go by age alone."""
+        parts = name.split("-")
+        if len(parts) < 3 or not parts[-2].isdigit():
+            return False
+        if int(parts[-2]) == os.getpid():
+            return False  # ours but not active: left by an earlier process that had the same pid
+        try:
+            os.kill(int(parts[-2]), 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True  # exists, owned by another user
+        return True
+
+    def sweep(self) -> int:
+        """Remove job directories older than max_age whose job is gone (not in this process, owner not running)."""
+        removed = 0
+        cutoff = time.time() - self.max_age
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.path in self._active or not entry.is_dir(follow_symlinks=False):
+                    continue
+                if self._owner_alive(entry.name):
+                    continue
+                try:
+                    if entry.stat(follow_symlinks=False).st_mtime < cutoff:
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                        removed += 1
+                except OSError:
+                    pass
+        if removed:
+            logger.info(f"Swept {removed} stale scratch directories")
+        return removed
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                logger.error(f"Scratch space sweep failed: {e}")
+            await asyncio.sleep(self.sweep_interval)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+scratch_space = ScratchSpace(
+    base_dir=config.scratch.base_dir,
+    prefer_shm=config.scratch.prefer_shm,
+    quota_bytes=config.scratch.quota_mb * 1024 * 1024,
+    max_age=config.scratch.max_age,
+    sweep_interval=config.scratch.sweep_interval,
+)
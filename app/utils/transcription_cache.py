@@ -0,0 +1,102 @@
+# app/utils/transcription_cache.py
+# Content-addressed Whisper results: forwarded voice notes and redelivered webhooks carry the same media
+# sha256, so a hit skips download, conversion and STT. SQLite on local disk, LRU-evicted by total text size.
+import base64, hashlib, logging, os, sqlite3, threading, time
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(file_path: str) -> str:
+    """Base64 SHA-256 of a file, the same encoding Meta uses for `audio.sha256` in webhooks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return base64.b64encode(digest.digest()).decode()
+
+
+class TranscriptionCache:
+    def __init__(self, db_path: str, max_bytes: int):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS transcriptions (
+                    media_sha256 TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    duration REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS transcriptions_last_access ON transcriptions (last_access)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, media_sha256: str) -> dict | None:
+        if not media_sha256:
+            return None
+        with self._lock:
+            conn = self._db()
+            row = conn.execute(
+                "SELECT text, duration FROM transcriptions WHERE media_sha256 = ?", (media_sha256,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE transcriptions SET last_access = ? WHERE media_sha256 = ?", (time.time(), media_sha256))
+            self.hits += 1
+        return {"data": row[0], "duration": row[1]}
+
+    def set(self, media_sha256: str, text: str, duration: float):
+        if not media_sha256 or not text:
+            return
+        size = len(text.encode())
+        with self._lock:
+            conn = self._db()
+            conn.execute(
+                "INSERT OR REPLACE INTO transcriptions (media_sha256, text, duration, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                (media_sha256, text, duration, size, time.time())
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM transcriptions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in conn.execute("SELECT media_sha256, size FROM transcriptions ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM transcriptions WHERE media_sha256 = ?", (key,))
+            total -= size
+            evicted += 1
+        logger.info(f"Evicted {evicted} cached transcriptions")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries, size = self._db().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM transcriptions").fetchone()
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+transcription_cache = TranscriptionCache(
+    db_path=config.transcription_cache.db_path,
+    max_bytes=config.transcription_cache.max_mb * 1024 * 1024,
+)
@@ -1,6 +1,7 @@
 import logging, sys, uvicorn
 import sys
 
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI
@@ -10,15 +11,41 @@ from app.config import config
 from app.middleware.user_cookie_injector import UserDataCookieMiddleware
 from app.middleware.auth_redirect_middleware import AuthRedirectMiddleware
 from app.utils.common_utils import create_dirs
+from app.modules.services.whatsapp.whatsapp_queue import inbound_queue
+from app.modules.services.whatsapp.status_buffer import status_buffer
+from app.db.db_operations.messages import warm_wamid_index
+from app.core.http_clients import close_http_clients
+from app.utils.scratch_space import scratch_space
+from app.modules.services.journal.autosave_buffer import autosave_buffer
+from app.modules.services.reports.report_events import report_event_hub
 
 
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG if config.project.log_level == "DEBUG" else logging.INFO)
 create_dirs()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_wamid_index()
+    await scratch_space.start()
+    await status_buffer.start()
+    await inbound_queue.start()
+    await autosave_buffer.start()
+    await report_event_hub.start()
+    yield
+    await report_event_hub.stop()
+    await autosave_buffer.stop()
+    await inbound_queue.stop()
+    await status_buffer.stop()
+    await close_http_clients()
+    await scratch_space.stop()
+
+
 app = FastAPI(
     title=config.project.project_name,
     version=config.project.project_version,
-    debug=True
+    debug=True,
+    lifespan=lifespan
 )
 
 app.add_middleware(UserDataCookieMiddleware)